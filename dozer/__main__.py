@@ -26,6 +26,20 @@ config = {
     },
     'log_level': 'INFO',
     'db_url': 'postgres:///dozer',
+    'db_replica_urls': [],
+    'db_slow_query_ms': 250,
+    'db_json_codec': 'stdlib',
+    'db_pool': {
+        'min_size': 2,
+        'max_size': 10,
+        'command_timeout': 30,
+        'max_inactive_connection_lifetime': 300,
+        'statement_timeout': 15,
+        'acquire_timeout': 10,
+        'health_check_interval': 30,
+        'circuit_breaker_threshold': 5,
+        'circuit_breaker_cooldown': 30
+    },
     'gmaps_key': "PUT GOOGLE MAPS API KEY HERE",
     'tz_url': '',
     'discord_token': "Put Discord API Token here.",
@@ -41,6 +55,12 @@ config = {
         },
 
     },
+    'loop_monitor': {
+        'interval': 0.25,
+        'slow_callback_ms': 250
+    },
+    'metrics_host': '127.0.0.1',
+    'metrics_port': None,
     'debug': False,
     'is_backup': False
 }
@@ -59,6 +79,11 @@ if 'discord_token' not in config:
 if sys.version_info < (3, 6):
     sys.exit('Dozer requires Python 3.6 or higher to run. This is version %s.' % '.'.join(sys.version_info[:3]))
 
+if sys.argv[1:2] == ['migrate']:
+    from .asyncdb import migrate
+    asyncio.get_event_loop().run_until_complete(migrate.main(sys.argv[2:], dsn=config['db_url']))
+    sys.exit()
+
 from . import Dozer  # After version check
 
 bot = Dozer(config)
@@ -68,7 +93,9 @@ for ext in os.listdir('dozer/cogs'):
         bot.load_extension('dozer.cogs.' + ext[:-3])  # Remove '.py'
 
 loop = asyncio.get_event_loop()
-loop.run_until_complete(orm.connect(dsn=config['db_url']))
+loop.run_until_complete(orm.connect(dsn=config['db_url'], replicas=config['db_replica_urls'],
+                                    slow_query_threshold=config['db_slow_query_ms'] / 1000, json_codec=config['db_json_codec'],
+                                    **config['db_pool']))
 loop.run_until_complete(orm.Model.create_all_tables())
 bot.run()
 
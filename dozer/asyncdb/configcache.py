@@ -1,9 +1,49 @@
-"""Module that contains the class that will reduce calls to postgres as much as possible. Has no growth limit (yet)"""
+"""Module that contains the class that will reduce calls to postgres as much as possible."""
+import asyncio
+import collections
+import json
+import sys
+import time
+import weakref
+
+
+def _sizeof(value):
+    """Roughly how many bytes a cached value takes up: the object itself plus its fields or items, one level deep."""
+    size = sys.getsizeof(value)
+    if isinstance(value, list):
+        size += sum(map(_sizeof, value))
+    elif hasattr(value, "_columns"):
+        size += sum(sys.getsizeof(getattr(value, field, None)) for field in value._columns)
+    return size
+
+
 class AsyncConfigCache:
-    """Class that will reduce calls to postgres as much as possible. Has no growth limit (yet)"""
-    def __init__(self, table):
-        self.cache = {}
+    """Class that will reduce calls to postgres as much as possible.
+    Holds at most max_entries results, evicting the least recently used ones first. Entries expire after ttl seconds
+    if it's set; results that found nothing (None or []) use negative_ttl instead, so guilds without any config don't
+    pin an entry forever.
+    Concurrent misses on the same query share a single database query.
+    If the table has __notify_keys__, the cache listens for the NOTIFYs ORM writes to it send, so it also notices writes
+    from other processes (a backup instance, other shards)."""
+    # every live cache, for stats
+    instances = weakref.WeakSet()
+
+    def __init__(self, table, max_entries=10000, ttl=None, negative_ttl=300):
+        # query hash -> (result, expiry time or None, size in bytes), least recently used first
+        self.cache = collections.OrderedDict()
         self.table = table
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # query hash -> task loading it from the database
+        self._inflight = {}
+        if table.__notify_keys__:
+            table._orm.listen(table.table_name(), self._on_notify)
+        self.instances.add(self)
 
     @staticmethod
     def _hash_dict(dic):
@@ -14,22 +54,145 @@ class AsyncConfigCache:
             values.append((k, dic[k]))
         return tuple(values)
 
+    def _get(self, query_hash):
+        """Returns (True, result) if query_hash has a live entry, marking it as recently used, else (False, None)."""
+        entry = self.cache.get(query_hash)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        result, expires, _ = entry
+        if expires is not None and expires <= time.monotonic():
+            self._remove(query_hash)
+            self.misses += 1
+            return False, None
+        self.cache.move_to_end(query_hash)
+        self.hits += 1
+        return True, result
+
+    def _put(self, query_hash, result):
+        """Caches result, evicting the least recently used entries if the cache is full."""
+        ttl = self.ttl if result else self.negative_ttl
+        size = _sizeof(result)
+        self._remove(query_hash)
+        self.cache[query_hash] = (result, None if ttl is None else time.monotonic() + ttl, size)
+        self.memory += size
+        while self.max_entries is not None and len(self.cache) > self.max_entries:
+            self._remove(next(iter(self.cache)))
+            self.evictions += 1
+
+    def _remove(self, query_hash):
+        entry = self.cache.pop(query_hash, None)
+        if entry is not None:
+            self.memory -= entry[2]
+
+    async def _load(self, query_hash, loader):
+        """Returns the cached result for query_hash, or awaits loader() to get it.
+        Callers missing on the same query at once all await the same load, and get its exception if it fails;
+        failures aren't cached. Cancelling one caller doesn't cancel the load for the others."""
+        found, result = self._get(query_hash)
+        if found:
+            return result
+        task = self._inflight.get(query_hash)
+        if task is None:
+            task = self._inflight[query_hash] = asyncio.ensure_future(self._fill(query_hash, loader))
+        return await asyncio.shield(task)
+
+    async def _fill(self, query_hash, loader):
+        try:
+            result = await loader()
+            # an invalidate_entry() while the query ran means result may already be stale; hand it out, don't keep it
+            if self._inflight.get(query_hash) is asyncio.current_task():
+                self._put(query_hash, result)
+            return result
+        finally:
+            if self._inflight.get(query_hash) is asyncio.current_task():
+                del self._inflight[query_hash]
+
     async def query_one(self, **kwargs):
         """Query the cache for an entry matching the kwargs, then try again using the database."""
-        query_hash = self._hash_dict(kwargs)
-        if query_hash not in self.cache:
-            self.cache[query_hash] = await self.table.select_one(**kwargs)
-        return self.cache[query_hash]
+        return await self._load(self._hash_dict(kwargs), lambda: self.table.select_one(**kwargs))
 
     async def query_all(self, **kwargs):
         """Query the cache for all entries matching the kwargs, then try again using the database."""
-        query_hash = self._hash_dict(kwargs)
-        if query_hash not in self.cache:
-            self.cache[query_hash] = await self.table.select(**kwargs)
-        return self.cache[query_hash]
+        return await self._load(self._hash_dict(kwargs), lambda: self.table.select(**kwargs))
+
+    async def _fetch_many(self, field, values):
+        """Fetches query_one(field=value) for all of values in a single query and caches the results.
+        Like _load(), each value counts as in flight while the query runs, so query_one() calls for them wait on it
+        and an invalidate_entry() meanwhile keeps the possibly stale result out of the cache."""
+        futures = {}
+        for value in values:
+            futures[value] = self._inflight[self._hash_dict({field: value})] = asyncio.get_event_loop().create_future()
+        return await asyncio.shield(asyncio.ensure_future(self._fill_many(field, futures)))
+
+    async def _fill_many(self, field, futures):
+        try:
+            rows = {getattr(row, field): row for row in await self.table.select_any(field, list(futures))}
+        except BaseException as e:
+            for value, future in futures.items():
+                query_hash = self._hash_dict({field: value})
+                if self._inflight.get(query_hash) is future:
+                    del self._inflight[query_hash]
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    # whoever awaits it still gets the exception; this just stops asyncio warning when nobody does
+                    future.exception()
+            raise
+        for value, future in futures.items():
+            query_hash = self._hash_dict({field: value})
+            if self._inflight.get(query_hash) is future:
+                self._put(query_hash, rows.get(value))
+                del self._inflight[query_hash]
+            future.set_result(rows.get(value))
+        return rows
+
+    async def preload(self, field, values):
+        """Fills in query_one(field=value) for every value with a single query, caching None for the ones with no row.
+        field has to be unique, e.g. the guild_id of a per-guild config table."""
+        await self._fetch_many(field, list(values))
+
+    async def query_many(self, field, values):
+        """Like query_one(field=value) for each of values, returning {value: result}.
+        Hits are answered from the cache and all the misses are fetched in a single query. field has to be unique."""
+        results = {}
+        missing = []
+        waiting = {}
+        for value in values:
+            query_hash = self._hash_dict({field: value})
+            found, result = self._get(query_hash)
+            if found:
+                results[value] = result
+            elif query_hash in self._inflight:
+                waiting[value] = self._inflight[query_hash]
+            else:
+                missing.append(value)
+        if missing:
+            rows = await self._fetch_many(field, missing)
+            results.update((value, rows.get(value)) for value in missing)
+        for value, task in waiting.items():
+            results[value] = await asyncio.shield(task)
+        return results
 
     def invalidate_entry(self, **kwargs):
         """Removes an entry from the cache if it exists - used to mark changed data."""
         query_hash = self._hash_dict(kwargs)
-        if query_hash in self.cache:
-            del self.cache[query_hash]
+        self._remove(query_hash)
+        self._inflight.pop(query_hash, None)
+
+    def _on_notify(self, payload):
+        """Evicts the entries a write to the table may have made stale.
+        payload is a JSON list of dicts of the changed rows' __notify_keys__; an entry is stale if its query could match
+        one of them. None means notifications were missed, so everything goes."""
+        changed = [{}] if payload is None else json.loads(payload)
+        for query_hash in set(self.cache) | set(self._inflight):
+            query = dict(query_hash)
+            if any(all(query.get(k, v) == v for k, v in keys.items()) for keys in changed):
+                self._remove(query_hash)
+                self._inflight.pop(query_hash, None)
+
+    def stats(self):
+        """Returns a dict of counters describing how the cache is doing."""
+        return {"entries": len(self.cache), "memory": self.memory, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions}
@@ -0,0 +1,218 @@
+"""
+Versioned schema migrations for the asyncdb ORM.
+
+Migrations are the files in migrations/ named like `0002_add_some_column.sql`, applied in version order.
+Each one runs in its own transaction together with the row recording it in the migrations table, so a failing
+step leaves nothing half-applied. A checksum of every applied file is stored so edits to history get noticed.
+
+Steps take their locks with a short lock_timeout and are retried, so an ALTER TABLE stuck behind a long query
+gives up and tries again instead of queueing every other query on that table behind itself.
+Put `-- migrate: no-transaction` on the first line of a file to run it outside a transaction, which
+CREATE INDEX CONCURRENTLY needs; such files must hold exactly one statement.
+
+Run them with `python -m dozer migrate`, or `python -m dozer migrate --dry-run` to see what would run.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import re
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+MIGRATIONS_TABLE = "public.schema_migrations"
+NO_TRANSACTION = "-- migrate: no-transaction"
+LOCK_TIMEOUT = "5s"
+# the schema create_all_tables built before migrations existed; 0001 only converts frcdozer databases to it
+BASELINE_VERSION = 1
+# tables only the old frcdozer schema has, which 0001 converts away
+FRCDOZER_TABLES = ("public.guilds", "public.modlogconfig")
+LOCK_RETRIES = 10
+
+
+class SchemaVersionError(Exception):
+    """Raised when the database schema doesn't match the migrations shipped with the bot."""
+
+
+class Migration:
+    """A single migration file."""
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode()).hexdigest()
+        self.transactional = not sql.startswith(NO_TRANSACTION)
+
+    def __repr__(self):
+        return f"{self.version:04}_{self.name}"
+
+
+def load_migrations(path=MIGRATIONS_DIR):
+    """Loads every migration file in path, sorted by version."""
+    migrations = {}
+    for file_name in os.listdir(path):
+        match = re.fullmatch(r"(\d+)_(\w+)\.sql", file_name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise SchemaVersionError(f"two migrations share version {version}: {migrations[version]} and {file_name}")
+        with open(os.path.join(path, file_name), encoding="utf-8") as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[v] for v in sorted(migrations)]
+
+
+async def create_table(conn):
+    """Creates the table that records applied migrations."""
+    await conn.execute(f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE}(version integer PRIMARY KEY, name text NOT NULL, "
+                       f"checksum text NOT NULL, applied_at timestamp NOT NULL DEFAULT now())")
+
+
+async def applied_versions(conn):
+    """Returns {version: checksum} of applied migrations, or None if the migrations table doesn't exist yet."""
+    if await conn.fetchval("SELECT to_regclass($1)", MIGRATIONS_TABLE) is None:
+        return None
+    return {r["version"]: r["checksum"] for r in await conn.fetch(f"SELECT version, checksum FROM {MIGRATIONS_TABLE}")}
+
+
+def pending(migrations, applied):
+    """Returns the migrations that have yet to be applied, raising if an applied one has since been edited."""
+    for migration in migrations:
+        if migration.version in applied and applied[migration.version] != migration.checksum:
+            raise SchemaVersionError(f"migration {migration} was changed after it was applied; add a new migration instead")
+    return [m for m in migrations if m.version not in applied]
+
+
+async def unversioned_kind(conn):
+    """For a database without a migrations table, tells what built it:
+    "empty" if it has no tables at all, "frcdozer" if it still has the old frcdozer tables that 0001 converts,
+    and "asyncdb" if its tables were built by create_all_tables before migrations existed (or upgrade.sql was
+    applied by hand), in which case it's at BASELINE_VERSION."""
+    if not await conn.fetchval("SELECT EXISTS(SELECT 1 FROM pg_tables WHERE schemaname NOT IN ('pg_catalog', 'information_schema'))"):
+        return "empty"
+    if await conn.fetchval("SELECT bool_or(to_regclass(t) IS NOT NULL) FROM unnest($1::text[]) AS t", FRCDOZER_TABLES):
+        return "frcdozer"
+    return "asyncdb"
+
+
+async def verify(conn, migrations=None):
+    """Checks at startup that every migration has been applied.
+    Returns "fresh" if the database has no tables at all, in which case the caller creates the schema from the Models
+    and should then stamp() it, or "unversioned" if it was built by create_all_tables before migrations existed, in
+    which case the caller should check its tables match the Models and then adopt() it. Returns "current" otherwise."""
+    migrations = load_migrations() if migrations is None else migrations
+    applied = await applied_versions(conn)
+    if applied is None:
+        kind = await unversioned_kind(conn)
+        if kind == "frcdozer":
+            raise SchemaVersionError("this is an old frcdozer database. Run `python -m dozer migrate` to convert it, "
+                                     "or `python -m dozer migrate --fake 1` if upgrade.sql was already applied by hand")
+        return "fresh" if kind == "empty" else "unversioned"
+    todo = pending(migrations, applied)
+    if todo:
+        raise SchemaVersionError(f"the database schema is behind, pending migrations: {', '.join(map(str, todo))}. "
+                                 f"Run `python -m dozer migrate` first")
+    return "current"
+
+
+async def adopt(conn, migrations=None):
+    """Starts tracking migrations on a database built by create_all_tables before migrations existed,
+    recording everything up to BASELINE_VERSION as applied. Raises if that leaves later migrations pending."""
+    migrations = load_migrations() if migrations is None else migrations
+    await stamp(conn, migrations, up_to=BASELINE_VERSION)
+    logger.info(f"started tracking schema migrations, marked migrations up to {BASELINE_VERSION} as applied")
+    await verify(conn, migrations)
+
+
+async def settle(conn, state, migrations=None):
+    """Starts tracking migrations once create_all_tables has dealt with the database verify() returned state for:
+    a fresh one was just built from the Models, which already include every migration, so it's stamped; an
+    unversioned one was built the same way before migrations existed and had every column, so it's adopted."""
+    if state == "fresh":
+        await stamp(conn, migrations)
+    elif state == "unversioned":
+        await adopt(conn, migrations)
+
+
+async def stamp(conn, migrations=None, up_to=None):
+    """Records migrations as applied without running them."""
+    migrations = load_migrations() if migrations is None else migrations
+    await create_table(conn)
+    await conn.executemany(f"INSERT INTO {MIGRATIONS_TABLE}(version, name, checksum) VALUES($1, $2, $3) ON CONFLICT DO NOTHING",
+                           [(m.version, m.name, m.checksum) for m in migrations if up_to is None or m.version <= up_to])
+
+
+async def _apply(conn, migration):
+    """Applies a single migration and records it."""
+    record = (f"INSERT INTO {MIGRATIONS_TABLE}(version, name, checksum) VALUES($1, $2, $3)",
+              migration.version, migration.name, migration.checksum)
+    if migration.transactional:
+        async with conn.transaction():
+            await conn.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+            await conn.execute(migration.sql)
+            await conn.execute(*record)
+    else:
+        await conn.execute(f"SET lock_timeout = '{LOCK_TIMEOUT}'")
+        try:
+            await conn.execute(migration.sql)
+        finally:
+            await conn.execute("RESET lock_timeout")
+        await conn.execute(*record)
+
+
+async def migrate(conn, dry_run=False, migrations=None):
+    """Applies every pending migration in order. Returns the migrations that were (or, for a dry run, would be) applied,
+    or None if the database is empty, which is left alone for the bot to build."""
+    migrations = load_migrations() if migrations is None else migrations
+    applied = await applied_versions(conn)
+    kind = None if applied is not None else await unversioned_kind(conn)
+    if kind == "empty":
+        # migrations only convert existing schemas; the bot creates a fresh one from the Models and stamps it itself
+        logger.info("the database is empty, nothing to migrate. The bot creates the schema when it first starts")
+        return None
+    if kind == "asyncdb":
+        # built by create_all_tables, so 0001's frcdozer conversion doesn't apply to it
+        applied = {m.version: m.checksum for m in migrations if m.version <= BASELINE_VERSION}
+        if not dry_run:
+            await stamp(conn, migrations, up_to=BASELINE_VERSION)
+            logger.info(f"marked migrations up to {BASELINE_VERSION} as applied, this database was built by the bot")
+    if not dry_run:
+        await create_table(conn)
+    todo = pending(migrations, applied or {})
+    for migration in todo:
+        if dry_run:
+            logger.info(f"would apply {migration}{'' if migration.transactional else ' (outside a transaction)'}:\n{migration.sql}")
+            continue
+        for attempt in range(1, LOCK_RETRIES + 1):
+            try:
+                await _apply(conn, migration)
+                break
+            except asyncpg.LockNotAvailableError:
+                if attempt == LOCK_RETRIES:
+                    raise
+                logger.warning(f"{migration} timed out waiting for a lock, retrying ({attempt}/{LOCK_RETRIES})")
+                await asyncio.sleep(attempt)
+        logger.info(f"applied {migration}")
+    return todo
+
+
+async def main(argv, dsn):
+    """Entry point for `python -m dozer migrate`."""
+    parser = argparse.ArgumentParser(prog="python -m dozer migrate", description="Applies pending database schema migrations.")
+    parser.add_argument("--dry-run", action="store_true", help="list the pending migrations without applying them")
+    parser.add_argument("--fake", type=int, metavar="VERSION", help="mark migrations up to VERSION as applied without running them")
+    args = parser.parse_args(argv)
+
+    conn = await asyncpg.connect(dsn)
+    try:
+        if args.fake is not None:
+            await stamp(conn, up_to=args.fake)
+            logger.info(f"marked migrations up to {args.fake} as applied")
+        elif await migrate(conn, dry_run=args.dry_run) == []:
+            logger.info("the database schema is up to date")
+    finally:
+        await conn.close()
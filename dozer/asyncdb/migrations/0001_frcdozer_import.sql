@@ -1,3 +1,6 @@
+-- converts a database from the old frcdozer (sqlalchemy) schema to the asyncdb one.
+-- already ran upgrade.sql by hand? mark this as applied with `python -m dozer migrate --fake 1` instead.
+
 -- fix the team_numbers number column
 ALTER TABLE team_numbers ALTER COLUMN team_number TYPE TEXT;
 
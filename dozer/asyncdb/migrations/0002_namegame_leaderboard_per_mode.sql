@@ -0,0 +1,11 @@
+-- leaderboard rows are per game mode, so the mode has to be part of the primary key.
+-- the old key was (user_id, guild_id), so no two rows can clash under the new one.
+-- 0001 drops the table on frcdozer databases; the bot then recreates it from the Model, which has the new key already.
+DO $$
+BEGIN
+    IF to_regclass('namegame_leaderboard') IS NOT NULL THEN
+        UPDATE namegame_leaderboard SET game_mode = 'frc' WHERE game_mode IS NULL;
+        ALTER TABLE namegame_leaderboard DROP CONSTRAINT namegame_leaderboard_pkey,
+            ADD PRIMARY KEY (user_id, guild_id, game_mode);
+    END IF;
+END $$;
@@ -12,36 +12,145 @@ That would be really, really bad.
 One can use the defualt orm instance or instantiate your own for other dbs.
 
 """
-import json
 import asyncio
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import math
+import time
+import weakref
 import asyncpg
 
+from . import codecs, migrate
 from .psqlt import Column
 
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + ".slow")
+
 class class_or_instancemethod(classmethod):
     """cursed cursed cursed cursed cursed cursed cursed cursed cursed cursed cursed"""
     def __get__(self, instance, type_):
         descr_get = super().__get__ if instance is None else self.__func__.__get__
         return descr_get(instance, type_)
 
+
+class ModelMeta(type):
+    """Gives every Model subclass __slots__ for its columns, so big result sets don't carry a __dict__ per row."""
+    def __new__(mcs, name, bases, namespace):
+        if "__slots__" not in namespace:
+            namespace["__slots__"] = tuple(k for k, v in namespace.get("__annotations__", {}).items() if isinstance(v, Column))
+        return super().__new__(mcs, name, bases, namespace)
+
+
+def _make_row_loader(model, offset=0):
+    """Generates a function that builds a `model` straight from a record laid out in `model._columns` order,
+    starting at column `offset`. Assigning each slot by position skips __init__ and the per-field name lookups of from_record."""
+    body = "".join(f"    obj.{field} = record[{i}]\n" for i, field in enumerate(model._columns, offset))
+    namespace = {"new": object.__new__, "model": model}
+    exec(f"def from_row(record):\n    obj = new(model)\n    obj.conn = None\n{body}    return obj\n", namespace)  # pylint: disable=exec-used
+    return namespace["from_row"]
+
+class DatabaseUnavailable(Exception):
+    """Raised instead of running a query while the circuit breaker is open, i.e. right after the database kept failing."""
+
+
+# failures that mean the database itself is in trouble, as opposed to a bad query
+_OUTAGE_ERRORS = (asyncio.TimeoutError, OSError, asyncpg.QueryCanceledError, asyncpg.PostgresConnectionError,
+                  asyncpg.ConnectionDoesNotExistError, asyncpg.CannotConnectNowError, asyncpg.TooManyConnectionsError)
+
+
+class QueryStats:
+    """Running totals for one query shape. Percentiles come from a window of the most recent timings."""
+    __slots__ = ("count", "errors", "rows", "total_time", "acquire_time", "recent")
+    window = 1000
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.acquire_time = 0.0
+        self.recent = collections.deque(maxlen=self.window)
+
+    def record(self, elapsed, acquire_wait, rows, failed):
+        """Adds one execution of the query."""
+        self.count += 1
+        self.errors += failed
+        self.rows += rows
+        self.total_time += elapsed
+        self.acquire_time += acquire_wait
+        self.recent.append(elapsed)
+
+    def percentile(self, p):
+        """Returns the p-th percentile (0-100) of the recent timings, in seconds."""
+        if not self.recent:
+            return 0.0
+        timings = sorted(self.recent)
+        return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+
+
+def _row_count(result):
+    """How many rows a fetch()/fetchrow() result holds."""
+    if result is None:
+        return 0
+    return len(result) if isinstance(result, list) else 1
+
+
+async def _build_indexes(conn, indexes):
+    """Builds indexes on tables that already exist, one at a time with CREATE INDEX CONCURRENTLY, so writes to what may
+    be big tables aren't blocked meanwhile. indexes holds (index name, CREATE INDEX statement, invalid) tuples, invalid
+    being whether the catalog listed the index as left invalid by a build that failed."""
+    # the pool's statement_timeout would cut long builds short
+    await conn.execute("SET statement_timeout = 0")
+    try:
+        for index_name, statement, invalid in indexes:
+            # IF NOT EXISTS would keep a failed build's invalid index, so that one is dropped first. Check again right
+            # before dropping, in case another instance rebuilt it since the catalog was read
+            valid = await conn.fetchval("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", index_name)
+            if valid:
+                continue
+            if valid is not None and not invalid:
+                # not something this startup saw fail: another instance may still be building it
+                logger.warning(f"index {index_name} is invalid, leaving it alone; it's rebuilt on the next start if it stays that way")
+                continue
+            if valid is not None:
+                await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+            logger.info(f"building index {index_name}, this can take a while on a big table")
+            await conn.execute(statement)
+    finally:
+        await conn.execute("RESET statement_timeout")
+
 #pylint: disable=not-an-iterable,too-many-statements,too-many-locals
 class ORM:
     """Wrapper class for everything I guess..."""
     pool: asyncpg.pool.Pool
     def __init__(self):
         self.ready_event = asyncio.Event()
-        class Model:
+        class Model(metaclass=ModelMeta):
             """Tables subclass this."""
+            __slots__ = ("conn",)
             __schemaname__ = "public"
             __tablename__ = None
             __primary_key__ = None
             __addn_sql__ = None
+            # tuples of column names to keep an index on, e.g. (("guild_id",), ("message_id", "reaction"))
+            __indexes__ = ()
+            # set to False for tables whose reads must never lag behind the primary
+            __read_replica__ = True
+            # columns sent in a NOTIFY on the table's channel after every write through the ORM, e.g. ("guild_id",).
+            # AsyncConfigCaches of the table listen on it, so writes from other processes evict their stale entries.
+            __notify_keys__ = ()
 
             # kwargs are just a way to put in fields
             def __init__(self, conn=None, **kwargs):
                 self.conn = conn
-                self.__dict__.update({k:None for k in self._columns.keys()})
-                self.__dict__.update(kwargs)
+                for k in self._columns:
+                    setattr(self, k, None)
+                for k, v in kwargs.items():
+                    setattr(self, k, v)
 
             def __repr__(self):
                 return self.__class__.__name__ + "(" + ", ".join(f"{key}={val!r}" for key, val in \
@@ -53,41 +162,82 @@ class ORM:
 
             @classmethod
             async def create_all_tables(cls):
-                """Creates all the tables in Postgres and populates all subclasses with necessary runtime information."""
-                async with self.pool.acquire() as conn:
-                    for scls in Model.__subclasses__():
-                        columns = {}
-                        for field_name, field_type in scls.__annotations__.items():
-                            if isinstance(field_type, Column):
-                                columns[field_name] = field_type.sql
-                        scls._columns = columns
-                        scls._orm = self
-                        if scls.__primary_key__:
-                            if not isinstance(scls.__primary_key__, tuple):
-                                raise TypeError(f"Primary key fields should be tuples, did you forget a comma in {scls.__name__}?")
+                """Creates all the tables in Postgres and populates all subclasses with necessary runtime information.
+                Changes to existing tables are left to migrations; this only checks that they have all been applied.
+                The catalog is read in one query and whatever's missing is created in one batch, so this costs the same
+                couple of round trips however many models there are. Indexes newly declared on existing tables are the
+                exception: they're built one by one with CREATE INDEX CONCURRENTLY so writes aren't blocked meanwhile."""
+                models = Model.__subclasses__()
+                # join shapes hold loaders built from the old column lists
+                self._join_queries.clear()
+                for scls in models:
+                    columns = {}
+                    for field_name, field_type in scls.__annotations__.items():
+                        if isinstance(field_type, Column):
+                            columns[field_name] = field_type.sql
+                    scls._columns = columns
+                    scls._orm = self
+                    scls._queries = {}
+                    scls._projection = ",".join(columns)
+                    scls._from_row = staticmethod(_make_row_loader(scls))
+                    if scls.__primary_key__:
+                        if not isinstance(scls.__primary_key__, tuple):
+                            raise TypeError(f"Primary key fields should be tuples, did you forget a comma in {scls.__name__}?")
+                    for index in scls.__indexes__:
+                        if not isinstance(index, tuple):
+                            raise TypeError(f"Index declarations should be tuples, did you forget a comma in {scls.__name__}?")
 
+                async with self.pool.acquire() as conn:
+                    state = await migrate.verify(conn)
+                    catalog = {(r["schema"], r["name"]): r for r in await conn.fetch(
+                        "SELECT t.schema, t.name, c.oid IS NOT NULL AS exists, "
+                        "ARRAY(SELECT attname::text FROM pg_attribute WHERE attrelid = c.oid AND attnum > 0 AND NOT attisdropped) AS columns, "
+                        "ARRAY(SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = c.oid AND indisvalid) AS indexes, "
+                        "ARRAY(SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = c.oid AND NOT indisvalid) AS invalid_indexes "
+                        "FROM unnest($1::text[], $2::text[]) AS t(schema, name) "
+                        "LEFT JOIN pg_class c ON c.oid = to_regclass(t.schema || '.' || t.name)",
+                        [scls.__schemaname__ for scls in models], [scls.__tablename__ for scls in models])}
+
+                    ddl = []
+                    # (index name, CREATE INDEX statement, whether an invalid copy was found) for indexes missing from
+                    # tables that already exist
+                    concurrent = []
+                    for scls in models:
+                        table = catalog[scls.__schemaname__, scls.__tablename__]
+                        if table["exists"]:
+                            missing = set(scls._columns) - set(table["columns"])
+                            if missing:
+                                raise TypeError(f"columns {missing} are missing from the {scls.table_name()} table! "
+                                                f"Is there a migration for them?")
+                        else:
+                            query_params = ", ".join(map(" ".join, zip(scls._columns.keys(), scls._columns.values())))
+                            if scls.__addn_sql__:
+                                query_params += ", " + scls.__addn_sql__
+                            if scls.__primary_key__:
+                                query_params += f", PRIMARY KEY({', '.join(k for k in scls.__primary_key__)})"
+                            # "but making sql like this is bad, you say." Yes. Yes it is. It is assumed, however, that this code
+                            # is never fed user inputs, in which case you probably just want a real ORM anyway.
+                            ddl.append(f"CREATE TABLE IF NOT EXISTS {scls.table_name()}({query_params})")
+
+                        for index in scls.__indexes__:
+                            index_name = f"{scls.__tablename__}_{'_'.join(index)}_idx"
+                            # indexes live in their table's schema, and regclass only qualifies names off the search path
+                            names = (index_name, f"{scls.__schemaname__}.{index_name}")
+                            if not table["exists"]:
+                                ddl.append(f"CREATE INDEX IF NOT EXISTS {index_name} ON {scls.table_name()}({', '.join(index)})")
+                            elif not any(name in table["indexes"] for name in names):
+                                concurrent.append((names[1],
+                                                   f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                                                   f"ON {scls.table_name()}({', '.join(index)})",
+                                                   any(name in table["invalid_indexes"] for name in names)))
+
+                    if ddl:
+                        # a multi-statement script without arguments goes over as one simple query
                         async with conn.transaction():
-                            db_columns = await conn.fetch("SELECT column_name from information_schema.columns "
-                                                          "WHERE table_schema = $1 AND table_name = $2",
-                                                          scls.__schemaname__, scls.__tablename__)
-
-                            if db_columns:
-                                db_column_names = set(map(lambda r: r["column_name"], db_columns))
-                                column_names = set(columns.keys())
-                                if column_names - db_column_names:
-                                    raise TypeError(f"columns {column_names - db_column_names} are missing from "
-                                                    f"the {scls.__schemaname__}.{scls.__tablename__} table!")
-                            else:
-
-                                query_params = ", ".join(map(" ".join, zip(columns.keys(), columns.values())))
-                                if scls.__addn_sql__:
-                                    query_params += ", " + scls.__addn_sql__
-                                if scls.__primary_key__:
-                                    query_params += f", PRIMARY KEY({', '.join(k for k in scls.__primary_key__)})"
-                                # "but making sql like this is bad, you say." Yes. Yes it is. It is assumed, however, that this code
-                                # is never fed user inputs, in which case you probably just want a real ORM anyway.
-                                query_str = f"CREATE TABLE IF NOT EXISTS {scls.__schemaname__}.{scls.__tablename__}({query_params})"
-                                await conn.fetch(query_str)
+                            await conn.execute(";\n".join(ddl))
+                    if concurrent:
+                        await _build_indexes(conn, concurrent)
+                    await migrate.settle(conn, state)
                 self.ready_event.set()
 
             @classmethod
@@ -95,54 +245,257 @@ class ORM:
                 """Converts an asyncpg.Record into a Model object."""
                 if record is None:
                     return None
-                ret = cls()
-                for field in cls._columns.keys():
+                ret = cls.__new__(cls)
+                ret.conn = None
+                for field in cls._columns:
                     setattr(ret, field, record[field])
                 return ret
 
             @classmethod
-            async def _fetch(cls, args, _one=False, conn=None):
+            def _compile(cls, kind, fields=(), where=(), extra=""):
+                """Returns the SQL for a query shape, building it the first time and caching it on the Model.
+                asyncpg prepares statements once per connection keyed on their text, so stable text also skips the re-parse."""
+                key = (kind, fields, where, extra)
+                qs = cls._queries.get(key)
+                if qs is not None:
+                    return qs
+
+                table = cls.table_name()
+                if kind == "select":
+                    qs = f"SELECT {cls._projection} FROM {table}"
+                    if where:
+                        qs += " WHERE " + " AND ".join(f"{f}=${i}" for i, f in enumerate(where, 1))
+                elif kind == "select_any":
+                    field, = where
+                    qs = f"SELECT {cls._projection} FROM {table} WHERE {field} = ANY($1)"
+                elif kind in ("insert", "upsert"):
+                    qs = f"INSERT INTO {table}({','.join(fields)}) VALUES(" + ",".join(f"${i}" for i in range(1, len(fields) + 1)) + ")"
+                    if kind == "upsert":
+                        pkeys = cls.__primary_key__ or ()
+                        # tables that are all primary key still need a DO UPDATE for RETURNING to hand back the row
+                        updates = tuple(f for f in fields if f not in pkeys) or pkeys
+                        qs += f" ON CONFLICT ({','.join(pkeys)}) DO UPDATE SET ({','.join(updates)}) = ROW(" + \
+                              ",".join(f"EXCLUDED.{f}" for f in updates) + ")"
+                elif kind == "update":
+                    # ROW() keeps single-column updates valid on postgres 10+
+                    qs = f"UPDATE {table} SET ({','.join(fields)}) = ROW(" + ",".join(f"${i}" for i in range(1, len(fields) + 1)) + ") " \
+                         "WHERE " + " AND ".join(f"{f} = ${i}" for i, f in enumerate(where, len(fields) + 1))
+                elif kind == "increment":
+                    field, = where
+                    n = len(fields) + 1
+                    qs = f"INSERT INTO {table}({','.join(fields)},{field}) VALUES(" + ",".join(f"${i}" for i in range(1, n + 1)) + \
+                         f") ON CONFLICT ({','.join(cls.__primary_key__)}) DO UPDATE SET {field} = {cls.__tablename__}.{field} + ${n} " \
+                         f"RETURNING {field}"
+                elif kind == "delete":
+                    qs = f"DELETE FROM {table} WHERE " + " AND ".join(f"{f}=${i}" for i, f in enumerate(where, 1))
+                else:
+                    raise ValueError(f"unknown query kind {kind!r}")
+                if extra:
+                    qs += " " + extra
+                if kind in ("select", "select_any", "update", "delete") and where and not cls._indexed(where):
+                    # shapes are only compiled once, so this warns once per query pattern
+                    logger.warning(f"{cls.__name__} is queried on ({', '.join(where)}), which no index covers; "
+                                   f"consider adding one to {cls.__name__}.__indexes__")
+                cls._queries[key] = qs
+                return qs
+
+            @classmethod
+            def _indexed(cls, fields):
+                """Whether some index (the primary key or one from __indexes__) can be used to filter on fields."""
+                indexes = ((cls.__primary_key__,) if cls.__primary_key__ else ()) + tuple(cls.__indexes__)
+                return any(index[0] in fields for index in indexes)
+
+            @classmethod
+            async def _run(cls, method, qs, args, conn=None, rows=None, read=False, primary=False):
+                """Runs conn.<method>(qs, *args), on a pooled connection if conn is None, and records how long it took.
+                rows is the row count to record when the result doesn't say, e.g. for executemany.
+                Reads may be sent to a read replica unless primary is set; anything else goes to the primary and counts as a
+                write to the table."""
+                # single statements run in autocommit; use orm.transaction() to group several into one unit of work
+                started = time.perf_counter()
+                acquired = None if conn is None else started
+                result = None
+                failed = True
                 try:
-                    f = 'fetchrow' if _one else 'fetch'
-                    if conn is None:
-                        async with cls._orm.pool.acquire() as conn:
-                            async with conn.transaction():
-                                return await getattr(conn, f)(*args)
-                    else:
-                        async with conn.transaction():
-                            return await getattr(conn, f)(*args)
-                except asyncpg.PostgresError:
-                    print("query", args[0], "failed!")
+                    with cls._orm.circuit():
+                        if conn is None:
+                            pool = cls._orm.read_pool(cls) if read and not primary else cls._orm.pool
+                            async with pool.acquire(timeout=cls._orm.acquire_timeout) as conn:
+                                acquired = time.perf_counter()
+                                result = await getattr(conn, method)(qs, *args)
+                        else:
+                            result = await getattr(conn, method)(qs, *args)
+                    failed = False
+                    return result
+                except asyncpg.PostgresError as e:
+                    # the caller gets the exception and its traceback; this just ties it to the query text
+                    logger.error(f"{cls.__name__} query failed ({e!r}): {qs}")
                     raise
+                finally:
+                    if not read:
+                        cls._orm.wrote(cls)
+                    cls._orm.record_query(cls.__name__, qs, started, acquired, _row_count(result) if rows is None else rows, failed)
+
+            @classmethod
+            async def _fetch(cls, args, _one=False, conn=None, read=False, primary=False):
+                return await cls._run('fetchrow' if _one else 'fetch', args[0], args[1:], conn=conn, read=read, primary=primary)
+
+            @classmethod
+            async def _executemany(cls, qs, args, conn=None):
+                return await cls._run('executemany', qs, (args,), conn=conn, rows=len(args))
+
+            @classmethod
+            def _changed(cls, row):
+                """Picks the __notify_keys__ values out of a Model or a dict, leaving out the ones it doesn't know."""
+                if isinstance(row, dict):
+                    return {k: row[k] for k in cls.__notify_keys__ if k in row}
+                return {k: getattr(row, k) for k in cls.__notify_keys__ if getattr(row, k, None) is not None}
+
+            @classmethod
+            async def _notify(cls, rows, conn=None):
+                """Tells everything listening on this table's channel (see ORM.listen) which rows just changed.
+                Sent on conn, if it's in a transaction the notification only goes out when it commits. Writes get conn from
+                _writing(), so the notification goes out with them."""
+                if not cls.__notify_keys__:
+                    return
+                changed = []
+                for row in rows:
+                    keys = cls._changed(row)
+                    if keys not in changed:
+                        changed.append(keys)
+                payload = json.dumps(changed)
+                if len(payload) > 7900:
+                    # NOTIFY payloads top out at 8000 bytes; an empty dict matches everything
+                    payload = "[{}]"
+                await cls._run("execute", "SELECT pg_notify($1, $2)", (cls.table_name(), payload), conn=conn)
+
+            @classmethod
+            @contextlib.asynccontextmanager
+            async def _writing(cls, conn=None):
+                """Yields the connection a write and its _notify() should run on: conn, or None (any pooled connection) for
+                tables that don't send notifications. Otherwise it's a pooled connection in a transaction, so the write and
+                the notification are sent over one connection and the notification goes out exactly when the write commits."""
+                async with contextlib.AsyncExitStack() as stack:
+                    if conn is None and cls.__notify_keys__:
+                        conn = await stack.enter_async_context(cls._orm.transaction())
+                    yield conn
 
             @classmethod
-            async def fetch(cls, *args, _conn=None):
-                """Equivalent to mapping Model.from_record onto the results of asyncpg.fetch."""
-                return [cls.from_record(r) for r in await cls._fetch(args, conn=_conn)]
+            async def fetch(cls, *args, _conn=None, _replica=False):
+                """Equivalent to mapping Model.from_record onto the results of asyncpg.fetch.
+                The query runs on the primary; pass _replica=True to let a read-only query go to a read replica."""
+                return [cls.from_record(r) for r in await cls._fetch(args, conn=_conn, read=_replica)]
 
             @classmethod
-            async def fetchrow(cls, *args, _conn=None):
-                """Equivalent to Model.from_record(await asyncpg.fetch(...))"""
-                return cls.from_record(await cls._fetch(args, _one=True, conn=_conn))
+            async def fetchrow(cls, *args, _conn=None, _replica=False):
+                """Equivalent to Model.from_record(await asyncpg.fetch(...)). See fetch() about _replica."""
+                return cls.from_record(await cls._fetch(args, _one=True, conn=_conn, read=_replica))
 
             async def insert(self, _conn=None, _upsert="", _fields=None):
                 """Inserts the model into the database. Use _upsert to specify an ON CONFLICT or other clause."""
-                fields = _fields or self._columns.keys()
-                qs = f"INSERT INTO {self.__schemaname__}.{self.__tablename__}({','.join(fields)}) VALUES(" + ",".join(
-                    f"${i}" for i in range(1, len(fields) + 1)) + ")" + (_upsert if _upsert else "")
-                args = [qs] + [getattr(self, f) for f in fields]
-                await self.fetch(*args, _conn=_conn)
+                fields = tuple(_fields or self._columns)
+                qs = self._compile("insert", fields, extra=_upsert or "")
+                async with self._writing(_conn) as conn:
+                    await self.fetch(qs, *[getattr(self, f) for f in fields], _conn=conn)
+                    await self._notify([self], conn)
 
             @classmethod
-            async def select(cls, _conn=None, _extra_sql="", **properties):
-                """Queries for Models matching the specified properties. Returns a list of matching results."""
-                if not properties:
-                    return await cls.fetch(f"SELECT * FROM {cls.__schemaname__}.{cls.__tablename__}")
-                else:
-                    fields = properties.keys()
-                    qs = f"SELECT * FROM {cls.__schemaname__}.{cls.__tablename__} WHERE " + " AND ".join(
-                        f"{f}=${i}" for i, f in enumerate(fields, 1)) + _extra_sql
-                    return await cls.fetch(*([qs] + list(properties.values())), _conn=_conn)
+            async def insert_many(cls, rows, on_conflict="", _conn=None, _fields=None):
+                """Inserts many Model objects in one batch using executemany. The batch is atomic.
+                on_conflict works like insert()'s _upsert, e.g. "ON CONFLICT DO NOTHING"."""
+                if not rows:
+                    return
+                fields = tuple(_fields or cls._columns)
+                qs = cls._compile("insert", fields, extra=on_conflict)
+                async with cls._writing(_conn) as conn:
+                    await cls._executemany(qs, [tuple(getattr(row, f) for f in fields) for row in rows], conn=conn)
+                    await cls._notify(rows, conn)
+
+            @classmethod
+            async def copy_records(cls, rows, _conn=None, _fields=None):
+                """Bulk loads Model objects with COPY, which beats insert_many() for very large batches.
+                COPY has no conflict handling, so a single duplicate key aborts the whole batch."""
+                if not rows:
+                    return
+                fields = tuple(_fields or cls._columns)
+                records = [tuple(getattr(row, f) for f in fields) for row in rows]
+                async with cls._writing(_conn) as conn:
+                    started = time.perf_counter()
+                    acquired = None if conn is None else started
+                    failed = True
+                    try:
+                        with cls._orm.circuit():
+                            if conn is None:
+                                async with cls._orm.acquire() as pooled:
+                                    acquired = time.perf_counter()
+                                    await pooled.copy_records_to_table(cls.__tablename__, records=records, columns=fields,
+                                                                       schema_name=cls.__schemaname__)
+                            else:
+                                await conn.copy_records_to_table(cls.__tablename__, records=records, columns=fields,
+                                                                 schema_name=cls.__schemaname__)
+                        failed = False
+                    finally:
+                        cls._orm.wrote(cls)
+                        cls._orm.record_query(cls.__name__, f"COPY {cls.table_name()}({','.join(fields)})", started, acquired,
+                                              len(records), failed)
+                    await cls._notify(rows, conn)
+
+            @classmethod
+            async def select(cls, _conn=None, _extra_sql="", _primary=False, **properties):
+                """Queries for Models matching the specified properties. Returns a list of matching results.
+                Runs on a read replica if there is one, unless _primary is set or the table was just written to."""
+                qs = cls._compile("select", where=tuple(properties), extra=_extra_sql)
+                return [cls._from_row(r) for r in await cls._fetch([qs, *properties.values()], conn=_conn, read=True, primary=_primary)]
+
+            @classmethod
+            async def select_any(cls, field, values, _conn=None, _primary=False):
+                """Queries for Models whose field is any of values, in a single query. See select() about _primary."""
+                qs = cls._compile("select_any", where=(field,))
+                return [cls._from_row(r) for r in await cls._fetch([qs, list(values)], conn=_conn, read=True, primary=_primary)]
+
+            @classmethod
+            async def iter(cls, _conn=None, _batch_size=100, _primary=False, **properties):
+                """Asynchronously iterates over Models matching the specified properties.
+                Rows are streamed from a server-side cursor _batch_size at a time, so memory use stays bounded on big tables.
+                The cursor's connection and transaction are held until iteration finishes. The query is recorded in
+                query_stats once it's done, timing only the database round trips and not the loop body."""
+                qs = cls._compile("select", where=tuple(properties))
+                started = time.perf_counter()
+                acquired = None
+                busy = 0.0
+                rows = 0
+                failed = True
+                try:
+                    async with contextlib.AsyncExitStack() as stack:
+                        with cls._orm.circuit():
+                            conn = _conn
+                            if conn is None:
+                                pool = cls._orm.pool if _primary else cls._orm.read_pool(cls)
+                                conn = await stack.enter_async_context(pool.acquire(timeout=cls._orm.acquire_timeout))
+                            acquired = time.perf_counter()
+                            await stack.enter_async_context(conn.transaction())
+                            cursor = await conn.cursor(qs, *properties.values())
+                        busy = time.perf_counter() - acquired
+                        failed = False
+                        while True:
+                            fetching = time.perf_counter()
+                            failed = True
+                            # as a probe, so an open cursor is read to the end even if the breaker opens meanwhile
+                            with cls._orm.circuit(probe=True):
+                                batch = await cursor.fetch(_batch_size)
+                            failed = False
+                            busy += time.perf_counter() - fetching
+                            rows += len(batch)
+                            for record in batch:
+                                yield cls._from_row(record)
+                            if len(batch) < _batch_size:
+                                break
+                except asyncpg.PostgresError as e:
+                    if failed:
+                        logger.error(f"{cls.__name__} query failed ({e!r}): {qs}")
+                    raise
+                finally:
+                    cls._orm.record_query(cls.__name__, qs, started, acquired, rows, failed, busy=busy)
 
             @classmethod
             async def get_by(cls, *args, **kwargs):
@@ -150,13 +503,13 @@ class ORM:
                 return await cls.select(*args, **kwargs)
 
             @classmethod
-            async def select_one(cls, _conn=None, **properties):
+            async def select_one(cls, _conn=None, _primary=False, **properties):
                 """Queries for a single Model matching the specified properties. Similar to .one_or_none() in sqlalchemy."""
                 if not properties:
                     raise ValueError("bruh which one do i pick")
-                fields = properties.keys()
-                qs = f"SELECT * FROM {cls.__schemaname__}.{cls.__tablename__} WHERE " + " AND ".join(f"{f}=${i}" for i, f in enumerate(fields, 1))
-                return await cls.fetchrow(*([qs] + list(properties.values())), _conn=_conn)
+                qs = cls._compile("select", where=tuple(properties))
+                record = await cls._fetch([qs, *properties.values()], _one=True, conn=_conn, read=True, primary=_primary)
+                return None if record is None else cls._from_row(record)
             
             async def update_or_add(self, *args, **kwargs):
                 """frcdozer orm compat"""
@@ -168,21 +521,20 @@ class ORM:
                  """
                 pkeys = self.__primary_key__ or tuple()
                 if _keys is None:
-                    fields = [k for k in self._columns.keys() if k not in pkeys]
+                    fields = tuple(k for k in self._columns.keys() if k not in pkeys)
                 else:
-                    fields = [k for k in self._columns.keys() if k in _keys and k not in pkeys]
+                    fields = tuple(k for k in self._columns.keys() if k in _keys and k not in pkeys)
 
                 if not properties:
                     if not pkeys:
                         raise ValueError("properties must be passed to update() if there is no primary key!")
                     else:
                         properties = {k: getattr(self, k) for k in self.__primary_key__}
-                qs = f"UPDATE {self.__schemaname__}.{self.__tablename__} SET ({','.join(fields)}) = (" + ",".join(
-                    f"${i}" for i in range(1, len(fields) + 1)) + ") " \
-                         "WHERE " + " AND ".join(f"{f} = ${i}" for i, f in enumerate(properties.keys(), len(fields) + 1))
-                # print(qs)
-
-                return await self.fetchrow(*([qs] + [getattr(self, f) for f in fields] + list(properties.values())), _conn=_conn)
+                qs = self._compile("update", fields, where=tuple(properties))
+                async with self._writing(_conn) as conn:
+                    ret = await self.fetchrow(qs, *[getattr(self, f) for f in fields], *properties.values(), _conn=conn)
+                    await self._notify([{**{k: getattr(self, k) for k in self._columns}, **properties}], conn)
+                return ret
 
             @class_or_instancemethod
             async def delete(self_or_cls, _conn=None, **properties):
@@ -199,18 +551,51 @@ class ORM:
                         raise ValueError("properties must be passed to delete() if there is no primary key!")
                     else:
                         properties = {k: getattr(self, k) for k in self.__primary_key__}
-                qs = f"DELETE FROM {self.__schemaname__}.{self.__tablename__} WHERE " + " AND ".join(
-                    f"{f}=${i}" for i, f in enumerate(properties.keys(), 1))
-                return await self.fetch(*([qs] + list(properties.values())), _conn=_conn)
+                qs = self._compile("delete", where=tuple(properties))
+                async with self._writing(_conn) as conn:
+                    ret = await self.fetch(qs, *properties.values(), _conn=conn)
+                    await self._notify([properties], conn)
+                return ret
 
             @classmethod
             async def delete_all(cls, _conn=None, **properties):
                 """Deletes all matching Models from the database."""
                 if not properties:
                     raise ValueError("delete_all() requires at least one keyword argument!")
-                qs = f"DELETE FROM {cls.__schemaname__}.{cls.__tablename__} WHERE " + " AND ".join(
-                    f"{f}=${i}" for i, f in enumerate(properties.keys(), 1))
-                return await cls.fetch(*([qs] + list(properties.values())), _conn=_conn)
+                qs = cls._compile("delete", where=tuple(properties))
+                async with cls._writing(_conn) as conn:
+                    ret = await cls.fetch(qs, *properties.values(), _conn=conn)
+                    await cls._notify([properties], conn)
+                return ret
+
+            @classmethod
+            async def increment(cls, field, by=1, _conn=None, **keys):
+                """Atomically adds `by` to `field` on the row matching keys, creating the row with field=by if it doesn't exist.
+                keys must be exactly the primary key fields. Returns the new value of the field."""
+                qs = cls._compile("increment", cls._increment_keys(keys), where=(field,))
+                async with cls._writing(_conn) as conn:
+                    value = (await cls._fetch([qs, *keys.values(), by], _one=True, conn=conn))[field]
+                    await cls._notify([keys], conn)
+                return value
+
+            @classmethod
+            async def increment_many(cls, field, keys, by=1, _conn=None):
+                """increment() for many rows in one executemany batch. keys is a list of dicts that all have the same fields."""
+                if not keys:
+                    return
+                qs = cls._compile("increment", cls._increment_keys(keys[0]), where=(field,))
+                async with cls._writing(_conn) as conn:
+                    await cls._executemany(qs, [(*k.values(), by) for k in keys], conn=conn)
+                    await cls._notify(keys, conn)
+
+            @classmethod
+            def _increment_keys(cls, keys):
+                if not cls.__primary_key__:
+                    raise TypeError("increment() requires a primary key on the table")
+                # the upsert conflicts on the primary key, so a key outside it would add to a row it doesn't match
+                if set(cls.__primary_key__) != keys.keys():
+                    raise ValueError(f"increment() keys must be exactly the primary key {cls.__primary_key__}, got {tuple(keys)}")
+                return tuple(keys)
 
             def primary_key(self):
                 """Returns the primary key tuple of the table."""
@@ -223,38 +608,247 @@ class ORM:
                 """Regurns the fully qualified table name of the Model."""
                 return f"{cls.__schemaname__}.{cls.__tablename__}"
 
-            async def upsert(self, conn=None, retry=5):
-                """This performs an upsert by doing a select then an insert/update, this can be subject to race conditions
-                and should be avoided if possible."""
-
-                exc = None
-                for i in range(retry):
-                    try:
-                        if not self.__primary_key__:
-                            # ig i could implement a checker?
-                            raise TypeError("upsert() requires a primary key on the table")
-                        if await self.select_one(**{k: getattr(self, k) for k in self.__primary_key__}, _conn=conn):
-                            await self.update(_conn=conn)
-                        else:
-                            await self.insert(_conn=conn)
-                        return
-                    except asyncpg.UniqueViolationError as e:
-                        exc = e
-                        # oops!
-                raise exc
+            async def upsert(self, conn=None):
+                """Inserts the Model, or updates the row with the same primary key, in a single statement.
+                The Model is refreshed from the stored row. Models with an unset primary key field (e.g. a serial id) can't
+                conflict with anything, so they are simply inserted."""
+                if not self.__primary_key__:
+                    raise TypeError("upsert() requires a primary key on the table")
+                if any(getattr(self, k) is None for k in self.__primary_key__):
+                    return await self.insert(_conn=conn)
+                fields = tuple(self._columns)
+                qs = self._compile("upsert", fields, extra=f"RETURNING {self._projection}")
+                async with self._writing(conn) as conn:
+                    record = await self._fetch([qs] + [getattr(self, f) for f in fields], _one=True, conn=conn)
+                    await self._notify([self], conn)
+                for field, value in zip(fields, record):
+                    setattr(self, field, value)
 
+            @classmethod
+            async def upsert_many(cls, rows, _conn=None):
+                """Upserts many Model objects in one executemany batch. See upsert()."""
+                if not rows:
+                    return
+                if not cls.__primary_key__:
+                    raise TypeError("upsert_many() requires a primary key on the table")
+                fields = tuple(cls._columns)
+                qs = cls._compile("upsert", fields)
+                async with cls._writing(_conn) as conn:
+                    await cls._executemany(qs, [tuple(getattr(row, f) for f in fields) for row in rows], conn=conn)
+                    await cls._notify(rows, conn)
+
+        Model._orm = self
         self.Model = Model
         self.acquire = None
         self.pool: asyncpg.pool.Pool
-
-    async def join(self, tables, tnames, join_on, where=None, addn_sql="", params=None, use_dict=True):
+        # (model name, query) -> QueryStats
+        self.query_stats = collections.defaultdict(QueryStats)
+        # queries slower than this many seconds are logged to the dozer.asyncdb.orm.slow logger
+        self.slow_query_threshold = 0.25
+        # after this many database failures in a row, queries fail fast for circuit_breaker_cooldown seconds
+        self.circuit_breaker_threshold = 5
+        self.circuit_breaker_cooldown = 30.0
+        self._failures = 0
+        self._circuit_open_until = 0.0
+        self._health_task = None
+        self.acquire_timeout = None
+        # pools for read replicas, if any were configured. Reads of a table go to the primary for
+        # read_your_writes_window seconds after it was written to, so replication lag doesn't hide fresh writes.
+        self.replica_pools = []
+        self.read_your_writes_window = 5.0
+        self._last_write = {}
+        self._next_replica = 0
+        # join() shape -> (SQL, row loaders)
+        self._join_queries = {}
+        # channel -> callbacks registered with listen(), and the connection they LISTEN on
+        self._listeners = {}
+        self._listen_conn = None
+        self._listen_dsn = None
+        self._listener_task = None
+        self._closing = False
+
+    def read_pool(self, *models):
+        """Returns the pool reads of models should use: a replica (round robin) if there are any, or the primary if a
+        model opted out with __read_replica__ = False or was written to within read_your_writes_window."""
+        if not self.replica_pools:
+            return self.pool
+        now = time.monotonic()
+        for model in models:
+            if not model.__read_replica__ or now - self._last_write.get(model.table_name(), -math.inf) < self.read_your_writes_window:
+                return self.pool
+        self._next_replica = (self._next_replica + 1) % len(self.replica_pools)
+        return self.replica_pools[self._next_replica]
+
+    def wrote(self, model):
+        """Notes that model's table was just written to, for read_pool."""
+        self._last_write[model.table_name()] = time.monotonic()
+
+    def record_query(self, source, qs, started, acquired, rows, failed=False, busy=None):
+        """Records a finished query in query_stats, and in the slow query log if it took too long.
+        started and acquired are time.perf_counter() readings from before and after getting a pool connection;
+        acquired is None if no connection could be had. busy is the time the query itself took, for when the
+        connection was also held for other things meanwhile (e.g. a cursor waiting on the code reading it)."""
+        finished = time.perf_counter()
+        if acquired is None:
+            acquired = finished
+        elapsed = finished - started if busy is None else acquired - started + busy
+        self.query_stats[source, qs].record(elapsed, acquired - started, rows, failed)
+        if elapsed >= self.slow_query_threshold:
+            slow_query_logger.warning(f"{source} query took {elapsed * 1000:.1f}ms ({(acquired - started) * 1000:.1f}ms waiting "
+                                      f"for a connection), {rows} rows{' and failed' if failed else ''}: {qs}")
+
+    def reset_query_stats(self):
+        """Clears query_stats."""
+        self.query_stats.clear()
+
+    def check_circuit(self):
+        """Raises DatabaseUnavailable if the circuit breaker is open."""
+        remaining = self._circuit_open_until - time.monotonic()
+        if remaining > 0:
+            raise DatabaseUnavailable(f"database queries are suspended for another {remaining:.0f}s after repeated failures")
+
+    @contextlib.contextmanager
+    def circuit(self, probe=False):
+        """Fails fast while the circuit breaker is open, and counts database outages inside the block towards opening it.
+        Once the cooldown is over queries are let through again; the first success closes the breaker and the first
+        failure opens it right back up. Probes (health checks) run even while it's open."""
+        if not probe:
+            self.check_circuit()
+        try:
+            yield
+        except _OUTAGE_ERRORS as e:
+            self._failures += 1
+            if self.circuit_breaker_threshold and self._failures >= self.circuit_breaker_threshold:
+                if not self._circuit_open_until:
+                    logger.error(f"{self._failures} database failures in a row (last: {e!r}), "
+                                 f"failing queries fast for {self.circuit_breaker_cooldown}s")
+                self._circuit_open_until = time.monotonic() + self.circuit_breaker_cooldown
+            raise
+        if self._failures:
+            if self._circuit_open_until:
+                logger.info("database recovered, closing the circuit breaker")
+            self._failures = 0
+            self._circuit_open_until = 0.0
+
+    async def _monitor_health(self, interval):
+        """Every interval seconds, warns if the pool is saturated and otherwise pings the database,
+        replacing the pooled connections if the ping fails."""
+        while True:
+            await asyncio.sleep(interval)
+            max_size = self.pool.get_max_size()
+            if self.pool.get_size() - self.pool.get_idle_size() >= max_size:
+                logger.warning(f"database pool saturated: all {max_size} connections are in use")
+                continue
+            try:
+                with self.circuit(probe=True):
+                    async with self.pool.acquire(timeout=interval) as conn:
+                        await conn.fetchval("SELECT 1", timeout=interval)
+            except _OUTAGE_ERRORS as e:
+                logger.warning(f"database health check failed ({e!r}), replacing pooled connections")
+                await self.pool.expire_connections()
+            except Exception:
+                logger.exception("database health check crashed")
+
+    def listen(self, channel, callback):
+        """Calls callback(payload) for every NOTIFY on channel. All channels share one connection of their own, opened by
+        connect(); if it drops, callback(None) is called once it's back, as notifications may have been missed meanwhile.
+        Bound methods are only weakly referenced, so a listening cache can simply be dropped."""
+        ref = weakref.WeakMethod(callback) if inspect.ismethod(callback) else (lambda: callback)
+        new_channel = channel not in self._listeners
+        self._listeners.setdefault(channel, []).append(ref)
+        if self._listen_conn is not None and new_channel:
+            asyncio.ensure_future(self._listen_conn.add_listener(channel, self._dispatch))
+        elif self._listen_conn is None and self._listen_dsn is not None and self._listener_task is None:
+            self._listener_task = asyncio.ensure_future(self._open_listener())
+
+    def _dispatch(self, conn, pid, channel, payload):  # pylint: disable=unused-argument
+        # channels are table names: another process just wrote to the table, so for read_your_writes_window the
+        # callbacks' refills go to the primary rather than a replica that may not have the write yet
+        self._last_write[channel] = time.monotonic()
+        refs = self._listeners.get(channel, [])
+        refs[:] = [ref for ref in refs if ref() is not None]
+        for ref in refs:
+            ref()(payload)
+
+    async def _open_listener(self, missed=False):
+        """Opens the connection listen() uses, retrying until it works. missed tells the callbacks to start over."""
+        delay = 1
+        while True:
+            try:
+                conn = await asyncpg.connect(self._listen_dsn)
+                break
+            except _OUTAGE_ERRORS as e:
+                logger.warning(f"couldn't open the LISTEN connection ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+        conn.add_termination_listener(self._listener_lost)
+        # from here on listen() subscribes new channels itself
+        self._listen_conn = conn
+        self._listener_task = None
+        for channel in list(self._listeners):
+            await conn.add_listener(channel, self._dispatch)
+        if missed:
+            for channel in list(self._listeners):
+                self._dispatch(conn, None, channel, None)
+
+    def _listener_lost(self, conn):  # pylint: disable=unused-argument
+        self._listen_conn = None
+        if not self._closing:
+            logger.warning("lost the LISTEN connection, reconnecting")
+            self._listener_task = asyncio.ensure_future(self._open_listener(missed=True))
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        """Acquires a connection and opens a transaction on it, yielding the connection.
+        Pass it as _conn= to Model methods that need to commit or roll back together."""
+        self.check_circuit()
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
+    async def join(self, tables, tnames, join_on, where=None, addn_sql="", params=None, use_dict=True, primary=False):
         """Performs black magic to perform a join. I don't even remember how this works anymore.
         tables, tnames, and on are NOT injection safe!
+        Like Model.select(), this can run on a read replica unless primary is set.
         """
+        if not params:
+            params = tuple()
+        key = (tuple(tables), tuple(tnames), tuple(join_on), where, addn_sql)
+        shape = self._join_queries.get(key)
+        if shape is None:
+            shape = self._join_queries[key] = self._compile_join(tables, tnames, join_on, where, addn_sql)
+        qs, loaders = shape
+
+        started = time.perf_counter()
+        acquired = None
+        rows = []
+        failed = True
+        try:
+            with self.circuit():
+                pool = self.pool if primary else self.read_pool(*tables)
+                async with pool.acquire(timeout=self.acquire_timeout) as conn:
+                    acquired = time.perf_counter()
+                    rows = await conn.fetch(qs, *params)
+            failed = False
+        finally:
+            self.record_query("join", qs, started, acquired, len(rows), failed)
+
+        if use_dict:
+            return [{tname: load(row) for tname, load in zip(tnames, loaders)} for row in rows]
+        return [tuple(load(row) for load in loaders) for row in rows]
+
+    @staticmethod
+    def _compile_join(tables, tnames, join_on, where, addn_sql):
+        """Builds the SQL for a join() shape, plus a row loader per table that picks its columns out of each record by
+        position. Every table's columns are selected explicitly, so each one starts at a known offset."""
         if len(tables) != (len(join_on) + 1) or len(tables) != len(tnames):
             raise TypeError("tables not same length as join_on")
 
-        qs_tables = ",'' AS \".\",".join(f'{t}.*' for t in tnames)
+        qs_columns = []
+        loaders = []
+        for table, tname in zip(tables, tnames):
+            loaders.append(_make_row_loader(table, len(qs_columns)))
+            qs_columns.extend(f"{tname}.{column}" for column in table._columns)
         qs_joins = ""
         for table, tname, on in zip(tables[1:], tnames[1:], join_on):
             qs_joins += f"INNER JOIN {table.table_name()} AS {tname} ON ({on}) "
@@ -262,57 +856,54 @@ class ORM:
         qs_where = ""
         if where:
             qs_where = f"WHERE {where}"
-        if not params:
-            params = tuple()
-        qs = f"SELECT {qs_tables} FROM {tables[0].table_name()} AS {tnames[0]} {qs_joins} {qs_where} {addn_sql}"
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(qs, *params)
-
-        ret = []
-        for row in rows:
-            t_idx = 0
-            obj_data = {}
-            ret_row = {} if use_dict else []
-            for column_name, value in row.items():
-                if column_name == '.':
-                    if use_dict:
-                        ret_row[tnames[t_idx]] = tables[t_idx].from_record(obj_data)
-                    else:
-                        ret_row.append(tables[t_idx].from_record(obj_data))
-                    t_idx += 1
-                    obj_data = {}
-                else:
-                    obj_data[column_name] = value
-
-            if use_dict:
-                ret_row[tnames[t_idx]] = tables[t_idx].from_record(obj_data)
-            else:
-                ret_row.append(tables[t_idx].from_record(obj_data))
-
-            if use_dict:
-                ret.append(ret_row)
-            else:
-                ret.append(tuple(ret_row))
-        return ret
-
-
-    async def connect(self, **kwargs):
-        """Connects to the database and creates the internal asyncpg pool."""
-        async def connection_initer(conn):
-            await conn.set_type_codec(
-                'json',
-                encoder=json.dumps,
-                decoder=json.loads,
-                schema='pg_catalog'
-            )
-
-        kwargs["init"] = connection_initer
+        qs = f"SELECT {','.join(qs_columns)} FROM {tables[0].table_name()} AS {tnames[0]} {qs_joins} {qs_where} {addn_sql}"
+        return qs, loaders
+
+    async def connect(self, slow_query_threshold=None, statement_timeout=None, acquire_timeout=None, health_check_interval=None,
+                      circuit_breaker_threshold=None, circuit_breaker_cooldown=None, replicas=(), read_your_writes_window=None,
+                      json_codec="stdlib", **kwargs):
+        """Connects to the database and creates the internal asyncpg pool.
+        Everything else in kwargs (min_size, max_size, command_timeout, max_inactive_connection_lifetime...) goes to
+        asyncpg.create_pool. All times are in seconds:
+        statement_timeout is enforced by Postgres on every statement; acquire_timeout bounds the wait for a pooled
+        connection; health_check_interval starts the pool health monitor; see circuit() for the breaker settings.
+        replicas is a list of DSNs of read replicas, which get pools of their own with the same settings; see read_pool().
+        json_codec names the codec for json/jsonb columns, see codecs.py."""
+        kwargs["init"] = codecs.get_codec(json_codec).register
+        if slow_query_threshold is not None:
+            self.slow_query_threshold = slow_query_threshold
+        if circuit_breaker_threshold is not None:
+            self.circuit_breaker_threshold = circuit_breaker_threshold
+        if circuit_breaker_cooldown is not None:
+            self.circuit_breaker_cooldown = circuit_breaker_cooldown
+        if read_your_writes_window is not None:
+            self.read_your_writes_window = read_your_writes_window
+        self.acquire_timeout = acquire_timeout
+        if statement_timeout:
+            kwargs["server_settings"] = {**kwargs.get("server_settings", {}), "statement_timeout": str(int(statement_timeout * 1000))}
+        # every Model query shape is a distinct statement; keep enough of them prepared per connection
+        kwargs.setdefault("statement_cache_size", 512)
         self.pool = await asyncpg.create_pool(**kwargs)
-        self.acquire = self.pool.acquire
+        self.acquire = functools.partial(self.pool.acquire, timeout=acquire_timeout)
+        self._listen_dsn = kwargs.pop("dsn", None)
+        if self._listeners:
+            await self._open_listener()
+        self.replica_pools = [await asyncpg.create_pool(dsn=dsn, **kwargs) for dsn in replicas]
+        if health_check_interval:
+            self._health_task = asyncio.get_event_loop().create_task(self._monitor_health(health_check_interval))
 
 
     async def close(self):
         """Shuts down the asyncpg pool."""
+        self._closing = True
+        if self._listener_task:
+            self._listener_task.cancel()
+        if self._listen_conn is not None:
+            await self._listen_conn.close()
+        if self._health_task:
+            self._health_task.cancel()
+        for pool in self.replica_pools:
+            await pool.close()
         await self.pool.close()
 
 orm = ORM()
@@ -22,6 +22,7 @@ if typing.TYPE_CHECKING:
     text = str
     real = double_precision = float
     boolean = bool
+    json = jsonb = typing.Any
 else:
     integer = Column('integer')
     int2 = Column('int2')
@@ -34,3 +35,5 @@ else:
     double_precision = Column('double precision')
     timestamp = Column('timestamp')
     boolean = Column('boolean')
+    json = Column('json')
+    jsonb = Column('jsonb')
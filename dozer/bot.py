@@ -1,15 +1,20 @@
 """Bot object for Dozer"""
 
+import asyncio
 import logging
 import re
+import resource
 import sys
+import time
 import traceback
 import discord
 import aiohttp
 from discord.ext import commands
 
 from . import utils
-from .asyncdb.orm import orm
+from .loopmonitor import LoopMonitor
+from .metrics import Metrics, MetricsServer
+from .asyncdb.orm import orm, DatabaseUnavailable
 
 # why on earth should logging objects be capitalized?
 dozer_logger = logging.getLogger('dozer')
@@ -45,6 +50,20 @@ class InvalidContext(commands.CheckFailure):
 
 class DozerContext(commands.Context):
     """Cleans all messages before sending"""
+    def __init__(self, **attrs):
+        super().__init__(**attrs)
+        # per-guild config cache -> this guild's entry, see config()
+        self._configs = {}
+
+    async def config(self, cache):
+        """Returns this guild's entry in a per-guild config cache (an AsyncConfigCache keyed on guild_id).
+        The lookup happens at most once per context, so every message stage sees the same config."""
+        if self.guild is None:
+            return None
+        if cache not in self._configs:
+            self._configs[cache] = await cache.query_one(guild_id=self.guild.id)
+        return self._configs[cache]
+
     async def send(self, content=None, **kwargs):  # pylint: disable=arguments-differ
         if content is not None:
             content = utils.clean(self, content, mass=True, member=False, role=False, channel=False)
@@ -56,6 +75,18 @@ class DozerContext(commands.Context):
         return await super().send(content, **kwargs)
 
 
+class MessageStage:
+    """One step of the message pipeline. Its timings are kept in the bot's metrics, under message_stage."""
+    def __init__(self, name, callback, order, bots, can_stop):
+        self.name = name
+        self.callback = callback
+        self.order = order
+        self.bots = bots
+        self.can_stop = can_stop
+        # how many times the stage stopped the pipeline
+        self.stops = 0
+
+
 class Dozer(commands.Bot):
     """Botty things that are critical to Dozer working"""
     #_global_cooldown = commands.Cooldown(1, 1, commands.BucketType.user)  # One command per second per user
@@ -71,6 +102,15 @@ class Dozer(commands.Bot):
         self._restarting = False
         self.check(self.global_checks)
         self.http_session = aiohttp.ClientSession(loop=self.loop)
+        self.metrics = Metrics()
+        self.metrics_server = None
+        if config.get('metrics_port'):
+            self.metrics_server = MetricsServer(self.metrics, config.get('metrics_host', '127.0.0.1'), config['metrics_port'],
+                                                gauges=self.metric_gauges)
+        self.loop_monitor = LoopMonitor(**config.get('loop_monitor', {}))
+        # every message goes through these, see on_message
+        self.message_stages = []
+        self.add_message_stage("commands", self.invoke, order=1000)
         if 'log_level' in config:
             dozer_log_handler.setLevel(config['log_level'])
 
@@ -103,6 +143,129 @@ class Dozer(commands.Bot):
     async def get_context(self, message, *, cls=DozerContext):
         return await super().get_context(message, cls=cls)
 
+    def add_message_stage(self, name, callback, order, bots=False, can_stop=False):
+        """Adds a stage to the message pipeline. callback is awaited with the message's context.
+        Stages with can_stop set run first, one at a time in ascending order (ties keep the order they were added in),
+        and return True to drop the message before anything else sees it, e.g. after deleting it. The other stages,
+        command processing included, then run concurrently and their return value is ignored.
+        Messages from bots skip the stage unless bots is set."""
+        if any(stage.name == name for stage in self.message_stages):
+            raise ValueError(f"there already is a message stage called {name!r}")
+        self.message_stages.append(MessageStage(name, callback, order, bots, can_stop))
+        self.message_stages.sort(key=lambda stage: stage.order)
+
+    def remove_message_stage(self, name):
+        """Removes a stage from the message pipeline."""
+        self.message_stages = [stage for stage in self.message_stages if stage.name != name]
+
+    def add_cog(self, cog):
+        super().add_cog(cog)
+        for attr, func in vars(type(cog)).items():
+            if hasattr(func, "__message_stage__"):
+                name, order, bots, can_stop = func.__message_stage__
+                self.add_message_stage(name, getattr(cog, attr), order, bots, can_stop)
+
+    def remove_cog(self, name):
+        cog = self.get_cog(name)
+        if cog is not None:
+            self.message_stages = [stage for stage in self.message_stages
+                                   if getattr(stage.callback, "__self__", None) is not cog]
+        super().remove_cog(name)
+
+    async def _run_message_stage(self, stage, ctx):
+        """Runs one stage of the message pipeline, timing it. Returns whether it stopped the pipeline."""
+        started = time.perf_counter()
+        failed = stop = False
+        try:
+            stop = bool(await stage.callback(ctx)) and stage.can_stop
+        except Exception:
+            failed = True
+            await self.on_error(f"on_message ({stage.name})", ctx.message)
+        self.metrics.observe("message_stage", stage.name, time.perf_counter() - started, failed)
+        if stop:
+            stage.stops += 1
+        return stop
+
+    async def on_message(self, message):
+        """Runs the message through the message pipeline.
+        The stages that can stop it run first, in order; commands and every other stage then run side by side, the
+        way separate on_message listeners would. The context is built once and shared by every stage; a stage that
+        raises is logged and the rest still run."""
+        ctx = await self.get_context(message)
+        stages = [stage for stage in self.message_stages if stage.bots or not message.author.bot]
+        for stage in stages:
+            if stage.can_stop and await self._run_message_stage(stage, ctx):
+                return
+        await asyncio.gather(*(self._run_message_stage(stage, ctx) for stage in stages if not stage.can_stop))
+
+    @staticmethod
+    def _listener_name(coro):
+        """Names an event handler after its cog (or the bot) and method, e.g. Moderation.on_member_join."""
+        owner = getattr(coro, "__self__", None)
+        if owner is None:
+            return getattr(coro, "__qualname__", repr(coro))
+        return f"{type(owner).__name__}.{coro.__name__}"
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        """Runs an event handler like discord.py does, timing it per event and per listener."""
+        started = time.perf_counter()
+        failed = cancelled = False
+        try:
+            await coro(*args, **kwargs)
+        except asyncio.CancelledError:
+            cancelled = True
+        except Exception:
+            failed = True
+            try:
+                await self.on_error(event_name, *args, **kwargs)
+            except asyncio.CancelledError:
+                pass
+        finally:
+            elapsed = time.perf_counter() - started
+            self.metrics.observe("event", event_name, elapsed, failed, cancelled)
+            self.metrics.observe("listener", self._listener_name(coro), elapsed, failed, cancelled)
+
+    async def invoke(self, ctx):
+        """Invokes a command like discord.py does, timing it per command."""
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        started = time.perf_counter()
+        cancelled = False
+        try:
+            await super().invoke(ctx)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            self.metrics.observe("command", ctx.command.qualified_name, time.perf_counter() - started,
+                                 ctx.command_failed, cancelled)
+
+    def metric_gauges(self):
+        """Returns the process-wide gauges served next to the histograms, as (name, description, value)."""
+        return (
+            ("dozer_guilds", "Guilds the bot is in", len(self.guilds)),
+            ("dozer_gateway_latency_seconds", "Gateway heartbeat latency", self.latency),
+            ("dozer_max_rss_kilobytes", "Peak resident memory of the process", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss),
+            ("dozer_tasks", "Tasks alive on the event loop", len(asyncio.all_tasks(self.loop))),
+            ("dozer_event_loop_lag_seconds", "99th percentile of recent event loop lag", self.loop_monitor.lag.percentile(99)),
+            ("dozer_event_loop_max_lag_seconds", "Longest event loop lag seen", self.loop_monitor.max_lag),
+            ("dozer_event_loop_stalls", "Times the event loop was blocked past the slow callback threshold",
+             self.loop_monitor.stalls),
+        )
+
+    async def start(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        self.loop_monitor.start(self.loop)
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        await super().start(*args, **kwargs)
+
+    async def on_error(self, event_method, *args, **kwargs):
+        if isinstance(sys.exc_info()[1], DatabaseUnavailable):
+            # listeners just skip their work while the database is down; one traceback per event would bury the logs
+            dozer_logger.warning('Skipped {} because the database is unavailable'.format(event_method))
+            return
+        await super().on_error(event_method, *args, **kwargs)
+
     async def on_command_error(self, context, exception):
         if isinstance(exception, commands.NoPrivateMessage):
             await context.send('{}, This command cannot be used in DMs.'.format(context.author.mention))
@@ -129,6 +292,9 @@ class Dozer(commands.Bot):
         elif isinstance(exception, (commands.CommandNotFound, InvalidContext)):
             pass  # Silent ignore
 
+        elif isinstance(getattr(exception, 'original', None), DatabaseUnavailable):
+            await context.send('{}, the database is having trouble right now. Try again in a bit!'.format(context.author.mention))
+
         else:
             await context.send('```\n%s\n```' % ''.join(traceback.format_exception_only(type(exception), exception)).strip())
             if isinstance(context.channel, discord.TextChannel):
@@ -170,5 +336,8 @@ class Dozer(commands.Bot):
         #await self.logout()
         await self.close()
         await orm.close()
+        self.loop_monitor.stop()
+        if self.metrics_server is not None:
+            await self.metrics_server.stop()
         await self.http_session.close()
         self.loop.stop()
@@ -7,7 +7,8 @@ from collections.abc import Mapping
 import discord
 from discord.ext import commands
 
-__all__ = ['bot_has_permissions', 'command', 'group', 'Cog', 'Reactor', 'Paginator', 'paginate', 'chunk', 'dev_check', 'member_avatar_url']
+__all__ = ['bot_has_permissions', 'command', 'group', 'Cog', 'message_stage', 'Reactor', 'Paginator', 'paginate', 'chunk', 'dev_check',
+           'member_avatar_url']
 
 
 class CommandMixin:
@@ -79,6 +80,16 @@ class Cog(commands.Cog):
         self.bot = bot
 
 
+def message_stage(name, order, *, bots=False, can_stop=False):
+    """Decorator marking a cog method as a stage of the bot's message pipeline, registered while the cog is loaded.
+    The method is awaited with the message's context; with can_stop set, it runs before commands and returns True
+    to drop the message. See Dozer.add_message_stage."""
+    def decorator(func):
+        func.__message_stage__ = (name, order, bots, can_stop)
+        return func
+    return decorator
+
+
 def dev_check():
     """Function decorator to check that the calling user is a developer"""
     async def predicate(ctx):
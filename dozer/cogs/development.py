@@ -1,13 +1,16 @@
 """Commands specific to development. Only approved developers can use these commands."""
 import copy
+import datetime
 import re
 import logging
 import discord
 
-from discord.ext.commands import NotOwner
+from discord.ext.commands import BadArgument, NotOwner
 
 from ._utils import *
 from ..asyncdb.orm import orm
+from ..asyncdb.configcache import AsyncConfigCache
+from ..metrics import KINDS
 
 logger = logging.getLogger("dozer")
 
@@ -113,6 +116,130 @@ class Development(Cog):
     `{prefix}su cooldude#1234 {prefix}ping` - simulate cooldude sending `{prefix}ping`
     """
 
+    @group(invoke_without_command=True)
+    async def dbstats(self, ctx, count: int = 10):
+        """Shows the database queries that have taken the most time in total since startup or the last reset."""
+        stats = sorted(orm.query_stats.items(), key=lambda item: item[1].total_time, reverse=True)[:count]
+        if not stats:
+            await ctx.send("No queries recorded yet.")
+            return
+        lines = []
+        for (source, qs), stat in stats:
+            lines.append(f"**{source}** `{qs[:200]}`\n"
+                         f"{stat.count} runs, {stat.errors} errors, {stat.rows} rows, {stat.total_time * 1000:.0f}ms total, "
+                         f"{stat.acquire_time * 1000:.0f}ms waiting for connections\n"
+                         f"p50 {stat.percentile(50) * 1000:.1f}ms, p95 {stat.percentile(95) * 1000:.1f}ms, "
+                         f"p99 {stat.percentile(99) * 1000:.1f}ms")
+        await self.line_print(ctx, "Query stats", lines, color=discord.Color.blue())
+
+    dbstats.example_usage = """
+    `{prefix}dbstats` - show the 10 query shapes that have taken the most database time
+    `{prefix}dbstats 25` - show the top 25 instead
+    """
+
+    @dbstats.command(name="reset")
+    async def dbstats_reset(self, ctx):
+        """Clears the recorded query stats."""
+        orm.reset_query_stats()
+        await ctx.send("Query stats cleared.")
+
+    dbstats_reset.example_usage = """
+    `{prefix}dbstats reset` - start counting query stats from scratch
+    """
+
+    @dbstats.command(name="caches")
+    async def dbstats_caches(self, ctx):
+        """Shows how each config cache is doing."""
+        lines = []
+        for cache in sorted(AsyncConfigCache.instances, key=lambda c: c.table.__name__):
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            lines.append(f"**{cache.table.__name__}**: {stats['entries']} entries, {stats['memory'] / 1024:.1f}KiB, "
+                         f"{stats['hits']}/{lookups} hits, {stats['evictions']} evictions")
+        await self.line_print(ctx, "Config caches", lines or ["No caches."], color=discord.Color.blue())
+
+    dbstats_caches.example_usage = """
+    `{prefix}dbstats caches` - show the size and hit rate of every config cache
+    """
+
+    @command()
+    async def pipeline(self, ctx):
+        """Shows the stages of the message pipeline, in the order they run, and how long each takes."""
+        lines = []
+        for stage in sorted(ctx.bot.message_stages, key=lambda stage: not stage.can_stop):
+            hist = ctx.bot.metrics.histogram("message_stage", stage.name)
+            stops = f"stopped the pipeline {stage.stops} times" if stage.can_stop else "runs alongside commands"
+            lines.append(f"**{stage.order}: {stage.name}**{' (bots too)' if stage.bots else ''}\n"
+                         f"{hist.count} runs, {hist.errors} errors, {stops}\n"
+                         f"mean {hist.mean * 1000:.1f}ms, p50 {hist.percentile(50) * 1000:.1f}ms, "
+                         f"p95 {hist.percentile(95) * 1000:.1f}ms, p99 {hist.percentile(99) * 1000:.1f}ms")
+        await self.line_print(ctx, "Message pipeline", lines, color=discord.Color.blue())
+
+    pipeline.example_usage = """
+    `{prefix}pipeline` - show what every incoming message goes through and how long each step takes
+    """
+
+    @group(invoke_without_command=True)
+    async def metrics(self, ctx, kind="listener", count: int = 10):
+        """Shows the event handlers, listeners, commands or message stages that have taken the most time in total.
+        kind is one of event, listener, command or message_stage."""
+        if kind not in KINDS:
+            raise BadArgument(f"kind must be one of {', '.join(KINDS)}")
+        histograms = sorted(ctx.bot.metrics.histograms[kind].items(), key=lambda item: item[1].total_time, reverse=True)
+        if not histograms:
+            await ctx.send(f"No {kind} timings recorded yet.")
+            return
+        lines = []
+        for name, hist in histograms[:count]:
+            lines.append(f"**{name}**: {hist.count} runs, {hist.errors} errors, {hist.cancelled} cancelled, "
+                         f"{hist.total_time * 1000:.0f}ms total\n"
+                         f"mean {hist.mean * 1000:.1f}ms, p50 {hist.percentile(50) * 1000:.1f}ms, "
+                         f"p95 {hist.percentile(95) * 1000:.1f}ms, p99 {hist.percentile(99) * 1000:.1f}ms")
+        await self.line_print(ctx, f"{kind.replace('_', ' ').capitalize()} timings", lines, color=discord.Color.blue())
+
+    metrics.example_usage = """
+    `{prefix}metrics` - show the 10 event listeners that have taken the most time
+    `{prefix}metrics command 25` - show the top 25 commands instead
+    """
+
+    @metrics.command(name="reset")
+    async def metrics_reset(self, ctx):
+        """Clears the recorded timings."""
+        ctx.bot.metrics.reset()
+        await ctx.send("Metrics cleared.")
+
+    metrics_reset.example_usage = """
+    `{prefix}metrics reset` - start timing from scratch
+    """
+
+    @group(invoke_without_command=True)
+    async def looplag(self, ctx, count: int = 3):
+        """Shows how far behind the event loop is running and what blocked it the last few times it stalled."""
+        monitor = ctx.bot.loop_monitor
+        lines = [f"lag p50 {monitor.lag.percentile(50) * 1000:.1f}ms, p95 {monitor.lag.percentile(95) * 1000:.1f}ms, "
+                 f"p99 {monitor.lag.percentile(99) * 1000:.1f}ms, max {monitor.max_lag * 1000:.0f}ms\n"
+                 f"{monitor.stalls} stalls over {monitor.threshold * 1000:.0f}ms since startup"]
+        for stall in list(monitor.slow_callbacks)[::-1][:max(count, 0)]:
+            when = datetime.datetime.utcfromtimestamp(stall.when).strftime("%Y-%m-%d %H:%M:%S UTC")
+            stack = "".join(stall.stack[-6:])[-1500:]
+            lines.append(f"**{stall.duration * 1000:.0f}ms** at {when}\n```\n{stack}```")
+        await self.line_print(ctx, "Event loop", lines, color=discord.Color.blue())
+
+    looplag.example_usage = """
+    `{prefix}looplag` - show event loop lag and the stacks of the last 3 stalls
+    `{prefix}looplag 0` - just show the lag
+    """
+
+    @looplag.command(name="reset")
+    async def looplag_reset(self, ctx):
+        """Clears the recorded lag and stalls."""
+        ctx.bot.loop_monitor.reset()
+        await ctx.send("Event loop stats cleared.")
+
+    looplag_reset.example_usage = """
+    `{prefix}looplag reset` - start measuring event loop lag from scratch
+    """
+
     @command()
     async def listservers(self, ctx):
         """Lists the servers that the bot is in. Only accessible to developers."""
@@ -34,8 +34,9 @@ class Hacks(Cog):
         await logs.send(res)
 
 
-    @Cog.listener()
-    async def on_message(self, message):
+    @message_stage("ftc_hacks", order=60, bots=True)
+    async def ftc_hacks(self, ctx):
+        message = ctx.message
         member = message.author
         if message.channel.id == VERIFY_CHANNEL_ID and message.content.lower().startswith("i have read the rules and regulations"):
             await member.add_roles(discord.utils.get(message.guild.roles, name="Member"))
@@ -152,6 +152,8 @@ class Info(Cog):
     async def stats(self, ctx):
         """Get current running internal/hosts stats for the bot"""
         info = await ctx.bot.application_info()
+        events, event_errors, event_cancelled = ctx.bot.metrics.totals("event")
+        commands_run, command_errors, _ = ctx.bot.metrics.totals("command")
 
         #e = discord.Embed(title=info.name + " Stats", color=discord.Color.blue())
         frame = "\n".join(map(lambda x: f"{str(x[0]):<24}{str(x[1])}", { #e.add_field(name=x[0], value=x[1], inline=False), {
@@ -164,7 +166,10 @@ class Info(Cog):
             f"{' Host stats ':=^48}": "",
             "Operating system:": os_name,
             "Process memory usage:": f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}K",
-            "Process uptime": str(datetime.timedelta(seconds=round(time.time() - startup_time)))
+            "Process uptime": str(datetime.timedelta(seconds=round(time.time() - startup_time))),
+            "Gateway latency:": f"{ctx.bot.latency * 1000:.0f}ms",
+            "Events handled:": f"{events} ({event_errors} errors, {event_cancelled} cancelled)",
+            "Commands run:": f"{commands_run} ({command_errors} failed)",
         }.items()))
         await ctx.send(f"```\n{frame}\n```")#embed=e)
 
@@ -191,11 +196,11 @@ class Info(Cog):
     `{prefix}afk robot building` - set yourself to AFK for reason "reason"
     """
 
-    @Cog.listener()
-    async def on_message(self, message):
+    @message_stage("afk", order=50, bots=True)
+    async def afk_check(self, ctx):
         """Primarily handles AFK"""
-        ctx = await self.bot.get_context(message)
-        if message.content.strip().startswith(f"{ctx.prefix}afk"):
+        message = ctx.message
+        if ctx.command is not None and ctx.command.qualified_name == "afk":
             return
 
         for member in message.mentions:
@@ -129,7 +129,7 @@ class Moderation(Cog):
         """Warns a user that they can't send links."""
         warn_msg = await msg.channel.send(f"{msg.author.mention}, you need the `{role.name}` role to post links!", delete_after=3)
 
-    async def check_links(self, msg):
+    async def check_links(self, msg, ctx=None):
         """Checks messages for the links role if necessary, then checks if the author is allowed to send links in the server"""
         if msg.guild is None or not isinstance(msg.author, discord.Member) or not msg.guild.me.guild_permissions.manage_messages:
             return
@@ -139,7 +139,10 @@ class Moderation(Cog):
         if msg.channel.id in [676583549561995274, 771188718198456321, 761068471252680704]:
             return
 
-        config: GuildConfig = await self.guild_config.query_one(guild_id=msg.guild.id)
+        if ctx is not None:
+            config = await ctx.config(self.guild_config)
+        else:
+            config = await self.guild_config.query_one(guild_id=msg.guild.id)
         if config is None or config.links_role_id is None or config.links_role_id == msg.guild.id:
             return
         role = msg.guild.get_role(config.links_role_id)
@@ -155,6 +158,8 @@ class Moderation(Cog):
         """Checks for messages sent in #robot-showcase without attachments or embeds and automatically deletes them."""
         if (msg.channel.id == 771188718198456321 or msg.channel.id == 676583549561995274) and not msg.attachments and not msg.embeds and not re.search("https?://", msg.content):
             await msg.delete()
+            return True
+        return False
 
     """=== context-free backend functions ==="""
 
@@ -203,7 +208,7 @@ class Moderation(Cog):
             if await Deafen.select_one(member_id=member.id, guild_id=member.guild.id, _conn=conn):
                 return False
             else:
-                user = Deafen(member_id=member.id, guild_id=member.guild.id, self_inflicted=self_inflicted, _conn=conn)
+                user = Deafen(member_id=member.id, guild_id=member.guild.id, self_inflicted=self_inflicted)
                 await user.insert(_conn=conn, _upsert="ON CONFLICT DO NOTHING")
                 await self.perm_override(member, read_messages=False, connect=False)
 
@@ -233,26 +238,30 @@ class Moderation(Cog):
 
     @Cog.listener()
     async def on_ready(self):
-        """Restore punishment timers on bot startup"""
-        async with orm.acquire() as conn:
-            q = await PunishmentTimerRecord.select(_conn=conn)
-            for r in q:
-                guild = self.bot.get_guild(r.guild_id)
-                actor = guild.get_member(r.actor_id)
-                target = guild.get_member(r.target_id)
-                orig_channel = self.bot.get_channel(r.orig_channel_id)
-                punishment_type = r.type
-                reason = r.reason or ""
-                seconds = max(int(r.target_ts - time.time()), 0.01)
-                await r.delete(_conn=conn)
-                self.bot.loop.create_task(self.punishment_timer(seconds,
-                                                                target,
-                                                                PunishmentTimerRecord.type_map[punishment_type],
-                                                                reason,
-                                                                actor,
-                                                                orig_channel=orig_channel,
-                                                                global_modlog=r.send_modlog))
-                getLogger('dozer').info(f"Restarted {PunishmentTimerRecord.type_map[punishment_type].__name__} of {target} in {guild}")
+        """Restore punishment timers and preload guild configs on bot startup"""
+        async for r in PunishmentTimerRecord.iter():
+            guild = self.bot.get_guild(r.guild_id)
+            actor = guild.get_member(r.actor_id)
+            target = guild.get_member(r.target_id)
+            orig_channel = self.bot.get_channel(r.orig_channel_id)
+            punishment_type = r.type
+            reason = r.reason or ""
+            seconds = max(int(r.target_ts - time.time()), 0.01)
+            await r.delete()
+            self.bot.loop.create_task(self.punishment_timer(seconds,
+                                                            target,
+                                                            PunishmentTimerRecord.type_map[punishment_type],
+                                                            reason,
+                                                            actor,
+                                                            orig_channel=orig_channel,
+                                                            global_modlog=r.send_modlog))
+            getLogger('dozer').info(f"Restarted {PunishmentTimerRecord.type_map[punishment_type].__name__} of {target} in {guild}")
+
+        # only a warm-up: configs that don't make it in are fetched on first use
+        try:
+            await self.guild_config.preload("guild_id", [guild.id for guild in self.bot.guilds])
+        except Exception as e:
+            getLogger('dozer').error(f"Failed to preload guild configs: {e!r}")
 
     @Cog.listener()
     async def on_member_join(self, member):
@@ -288,20 +297,30 @@ class Moderation(Cog):
             channel = member.guild.get_channel(config.member_log_channel_id)
             await channel.send(embed=leave)
 
-    @Cog.listener()
-    async def on_message(self, message):
-        """Check things when messages come in."""
-        if message.author.bot or message.guild is None or not message.guild.me.guild_permissions.manage_roles:
+    @message_stage("link_scrub", order=10, can_stop=True)
+    async def scrub_links(self, ctx):
+        """Deletes links from members who may not post them."""
+        message = ctx.message
+        if message.guild is None or not message.guild.me.guild_permissions.manage_roles:
+            return False
+        return await self.check_links(message, ctx)
+
+    @message_stage("showcase_check", order=20, can_stop=True)
+    async def showcase_check(self, ctx):
+        """Deletes chatter in the showcase channels."""
+        message = ctx.message
+        if message.guild is None or not message.guild.me.guild_permissions.manage_roles:
+            return False
+        return await self.check_talking_showcase(message)
+
+    @message_stage("new_member_phrase", order=30)
+    async def new_member_phrase(self, ctx):
+        """Gives the member role to new members who type the new member phrase in the new members channel."""
+        message = ctx.message
+        if message.guild is None or not message.guild.me.guild_permissions.manage_roles:
             return
 
-        if await self.check_links(message):
-            return
-
-        if await self.check_talking_showcase(message):
-            return
-
-        config: GuildConfig = await self.guild_config.query_one(guild_id=message.guild.id)
-
+        config: GuildConfig = await ctx.config(self.guild_config)
         if config is not None and config.new_members_channel_id and config.new_members_role_id:
             string = config.new_members_message
             content = message.content.casefold()
@@ -900,8 +919,6 @@ class GuildConfigCache(configcache.AsyncConfigCache):
         return config
 
 
-# ALTER TABLE mutes RENAME COLUMN id TO member_id
-# ALTER TABLE deafens RENAME COLUMN id TO member_id
 class Mute(orm.Model):
     """Provides a DB config to track mutes."""
     __tablename__ = 'mutes'
@@ -929,6 +946,8 @@ class PunishmentTimerRecord(orm.Model):
     """Keeps track of current punishment timers in case the bot is restarted."""
     __tablename__ = "punishment_timers"
     __primary_key__ = ("id",)
+    # timers are restored from this table right after a restart, so a lagging replica could lose or replay them
+    __read_replica__ = False
     # the `id` field is autoincremented by sqlalchemy
     # DON'T change this to a bigint or stuff breaks. whoops.
     # and when on earth are you going to have more than 2 billion punishment timers going, anyway?
@@ -944,9 +963,8 @@ class PunishmentTimerRecord(orm.Model):
 
     async def insert(self, _conn=None, _upsert=None, _fields=None):
         """we need to redefine this for this class to account for some _serial_ shortcomings in the orm"""
-        fields = [k for k in self._columns.keys() if k != "id"]
-        qs = f"INSERT INTO {self.__schemaname__}.{self.__tablename__}({','.join(fields)}) VALUES(" + ",".join(
-            f"${i}" for i in range(1, len(fields) + 1)) + ") RETURNING id"
+        fields = tuple(k for k in self._columns.keys() if k != "id")
+        qs = self._compile("insert", fields, extra="RETURNING id")
         args = [qs] + [getattr(self, f) for f in fields]
         return (await self._fetch(args, _one=True, conn=_conn))["id"]
 
@@ -957,6 +975,7 @@ class GuildConfig(orm.Model):
     """Stores guild specific general configuration. """
     __tablename__ = "guild_config"
     __primary_key__ = ("guild_id",)
+    __notify_keys__ = ("guild_id",)
     _cache = None
     guild_id: psqlt.bigint
     guild_name: psqlt.text
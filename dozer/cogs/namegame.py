@@ -663,33 +663,19 @@ class NameGame(Cog):
             # winning condition
             winner = list(game.players.keys())[0]
 
-            record = await NameGameLeaderboard.select_one(user_id=winner.id, guild_id=ctx.guild.id, game_mode=game.mode)
-            if record is None:
-                record = NameGameLeaderboard(user_id=winner.id, guild_id=ctx.guild.id, wins=1, game_mode=game.mode)
-                await record.insert()
-            else:
-                record.wins += 1
-                await record.update()
+            wins = await NameGameLeaderboard.increment("wins", user_id=winner.id, guild_id=ctx.guild.id, game_mode=game.mode)
             win_embed = discord.Embed()
             win_embed.color = discord.Color.gold()
             win_embed.title = "We have a winner!"
             win_embed.add_field(name="Winning Player", value=winner)
-            win_embed.add_field(name="Wins Total", value=record.wins)
+            win_embed.add_field(name="Wins Total", value=wins)
             win_embed.add_field(name="Teams Picked", value=game.get_picked())
             await ctx.send(embed=win_embed)
 
             game.running = False
 
         if not game.running:
-            async with orm.acquire() as conn:
-                for team in game.picked:
-                    stats = await NameGameTeamStats.select_one(team_id=team, game_mode=game.mode, _conn=conn)
-                    if stats is None:
-                        stats = NameGameTeamStats(team_id=team, game_mode=game.mode, uses=1)
-                        await stats.insert(_conn=conn)
-                    else:
-                        stats.uses += 1
-                        await stats.update(_conn=conn)
+            await NameGameTeamStats.increment_many("uses", [{"team_id": team, "game_mode": game.mode} for team in game.picked])
 
             self.games.pop(ctx.channel.id)
 
@@ -840,11 +826,12 @@ class NameGameConfig(orm.Model):
     mode: psqlt.text
     pings_enabled: psqlt.bigint
 
-# DROP namegame_leaderboard;
+
 class NameGameLeaderboard(orm.Model):
     """Leaderboard storage object"""
     __tablename__ = "namegame_leaderboard"
-    __primary_key__ = ("user_id", "guild_id")
+    __primary_key__ = ("user_id", "guild_id", "game_mode")
+    __indexes__ = (("game_mode", "wins"),)
     user_id: psqlt.bigint
     guild_id: psqlt.bigint
     wins: psqlt.bigint
@@ -854,6 +841,7 @@ class NameGameTeamStats(orm.Model):
     """interesting team frequency stats"""
     __tablename__ = "namegame_teamstats"
     __primary_key__ = ("team_id", "game_mode")
+    __indexes__ = (("game_mode", "uses"),)
     team_id: psqlt.bigint
     game_mode: psqlt.text
     team_nickname: psqlt.text
@@ -60,11 +60,6 @@ class News(Cog):
         for source in self.sources.values():
 
             DOZER_LOGGER.debug(f"Getting source {source.full_name}")
-            subs = await NewsSubscription.get_by(source=source.short_name)
-            if not subs:
-                DOZER_LOGGER.debug(f"Skipping source {source.full_name} due to no subscriptions")
-                continue
-
             channel_dict = {}
             # of the form
             # {
@@ -76,7 +71,7 @@ class News(Cog):
             #       discord.Channel: 'plain' or 'embed'
             #   }
             # }
-            for sub in subs:
+            async for sub in NewsSubscription.iter(source=source.short_name):
                 channel = self.bot.get_channel(sub.channel_id)
                 if channel is None:
                     DOZER_LOGGER.error(f"Channel {sub.channel_id} (sub ID {sub.id}) returned None. Not removing this"
@@ -92,6 +87,10 @@ class News(Cog):
 
                 channel_dict[sub.data][channel] = sub.kind
 
+            if not channel_dict:
+                DOZER_LOGGER.debug(f"Skipping source {source.full_name} due to no subscriptions")
+                continue
+
             # We've gotten all of the channels we need to post to, lets get the posts and post them now
             try:
                 posts = await source.get_new_posts()
@@ -133,8 +132,7 @@ class News(Cog):
             try:
                 self.sources[source.short_name] = source(aiohttp_session=self.http_source, bot=self.bot)
                 if issubclass(source, DataBasedSource):
-                    subs = await NewsSubscription.get_by(source=source.short_name)
-                    data = {sub.data for sub in subs}
+                    data = {sub.data async for sub in NewsSubscription.iter(source=source.short_name)}
                     await self.sources[source.short_name].first_run(data)
                 else:
                     await self.sources[source.short_name].first_run()
@@ -428,6 +426,7 @@ class NewsSubscription(orm.Model):
     """Represents a single subscription of one news source to one channel"""
     __tablename__ = 'news_subs'
     __primary_key__ = ('id',)
+    __indexes__ = (("source", "data"), ("guild_id", "channel_id"))
 
     id: psqlt.Column("serial")
     channel_id: psqlt.Column("bigint NOT NULL")
@@ -459,8 +458,7 @@ class NewsSubscription(orm.Model):
 
     async def insert(self, _conn=None, _upsert=None, _fields=None):
         """we need to redefine this for this class to account for some _serial_ shortcomings in the orm"""
-        fields = [k for k in self._columns.keys() if k != "id"]
-        qs = f"INSERT INTO {self.__schemaname__}.{self.__tablename__}({','.join(fields)}) VALUES(" + ",".join(
-            f"${i}" for i in range(1, len(fields) + 1)) + ") RETURNING id"
+        fields = tuple(k for k in self._columns.keys() if k != "id")
+        qs = self._compile("insert", fields, extra="RETURNING id")
         args = [qs] + [getattr(self, f) for f in fields]
         return (await self._fetch(args, _one=True, conn=_conn))["id"]
@@ -127,8 +127,8 @@ class Roles(Cog):
             e.add_field(name='I couldn\'t restore these roles, as I don\'t have permission.',
                         value='\n'.join(sorted(cant_give)))
 
-        # let's also make regiving roles atomic...ish.
-        async with orm.acquire() as conn:
+        # let's also make regiving roles atomic.
+        async with orm.transaction() as conn:
             for missing_role in missing_roles:
                 await missing_role.delete(_conn=conn)
 
@@ -147,11 +147,11 @@ class Roles(Cog):
         """Saves a member's roles when they leave in case they rejoin."""
         guild_id = member.guild.id
         member_id = member.id
-        async with orm.acquire() as conn:
+        async with orm.transaction() as conn:
             await conn.fetch(f"DELETE FROM {MissingRole.table_name()} WHERE member_id=$1 AND guild_id=$2", member_id, guild_id)
-            for role in member.roles[1:]:  # Exclude the @everyone role
-                await MissingRole(role_id=role.id, role_name=role.name,
-                                  member_id=member_id, guild_id=guild_id).insert(_upsert="ON CONFLICT DO NOTHING", _conn=conn)
+            await MissingRole.insert_many([MissingRole(role_id=role.id, role_name=role.name, member_id=member_id, guild_id=guild_id)
+                                           for role in member.roles[1:]],  # Exclude the @everyone role
+                                          on_conflict="ON CONFLICT DO NOTHING", _conn=conn)
 
     async def giveme_purge(self, role_id_list):
         """Purges roles in the giveme database that no longer exist"""
@@ -536,6 +536,7 @@ class RoleMenu(orm.Model):
     """Contains a role menu, used for editing and initial create"""
     __tablename__ = 'role_menus'
     __primary_key__ = ('message_id',)
+    __indexes__ = (("guild_id",),)
 
     guild_id: psqlt.bigint
     channel_id: psqlt.bigint
@@ -546,6 +547,7 @@ class ReactionRole(orm.Model):
     """Contains a role menu entry"""
     __tablename__ = 'reaction_roles'
     __primary_key__ = ('message_id', 'role_id')
+    __indexes__ = (("message_id", "reaction"),)
 
     guild_id: psqlt.bigint
     channel_id: psqlt.bigint
@@ -557,6 +559,7 @@ class GiveableRole(orm.Model):
     """Database object for maintaining a list of giveable roles."""
     __tablename__ = 'giveable_roles'
     __primary_key__ = ("role_id",)
+    __indexes__ = (("guild_id",),)
 
     role_id: psqlt.bigint
     guild_id: psqlt.bigint
@@ -565,6 +568,7 @@ class MissingRole(orm.Model):
     """Holds what roles a given member had when they last left the guild."""
     __tablename__ = 'missing_roles'
     __primary_key__ = ('role_id', 'member_id')
+    __indexes__ = (("member_id", "guild_id"),)
 
     role_id: psqlt.bigint
     guild_id: psqlt.bigint
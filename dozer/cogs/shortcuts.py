@@ -3,6 +3,7 @@ import collections
 import asyncio
 import csv
 import io
+import json
 import logging
 from typing import Dict, List
 import aiohttp
@@ -18,12 +19,58 @@ from ..asyncdb import psqlt, configcache
 
 class Shortcuts(Cog):
     MAX_LEN = 20
+    # how many guilds' shortcuts to keep indexed in memory; the least recently used ones are dropped first
+    MAX_GUILDS = 1000
+    # largest CSV file shortcuts import accepts
+    MAX_IMPORT_BYTES = 1024 * 1024
     def __init__(self, bot):
         """cog init"""
         super().__init__(bot)
         self.settings_cache = configcache.AsyncConfigCache(ShortcutSetting)
         self.cache = configcache.AsyncConfigCache(ShortcutEntry)
-        self.guild_table: Dict[int, Dict[str, str]] = {}
+        # guild id -> {casefolded shortcut name: message}, least recently used first
+        self.guild_table: Dict[int, Dict[str, str]] = collections.OrderedDict()
+        # bumped whenever a guild's shortcuts change (or, for _epoch, all of them), so a load that was running
+        # meanwhile knows its result is stale
+        self._generations = collections.Counter()
+        self._epoch = 0
+        orm.listen(ShortcutEntry.table_name(), self._on_shortcuts_changed)
+
+    async def guild_shortcuts(self, guild_id):
+        """Returns the shortcut index of a guild, loading it on first use."""
+        table = self.guild_table.get(guild_id)
+        if table is None:
+            generation = (self._epoch, self._generations[guild_id])
+            table = {e.name.casefold(): e.value for e in await ShortcutEntry.select(guild_id=guild_id)}
+            # if the shortcuts changed while loading, use the result this once but don't keep it
+            if generation == (self._epoch, self._generations[guild_id]):
+                self.guild_table[guild_id] = table
+                while len(self.guild_table) > self.MAX_GUILDS:
+                    self.guild_table.popitem(last=False)
+        else:
+            self.guild_table.move_to_end(guild_id)
+        return table
+
+    def _on_shortcuts_changed(self, payload):
+        """Drops the indexes of guilds whose shortcuts were changed by another process."""
+        changed = [{}] if payload is None else json.loads(payload)
+        if any("guild_id" not in keys for keys in changed):
+            self._epoch += 1
+            self.guild_table.clear()
+            return
+        for keys in changed:
+            self._generations[keys["guild_id"]] += 1
+            self.guild_table.pop(keys["guild_id"], None)
+
+    @staticmethod
+    async def _check_case_clashes(guild_id, names):
+        """Raises if one of names only differs by case from a shortcut the guild already has.
+        Shortcuts are matched regardless of case, so the two could never both be used."""
+        folded = {name.casefold(): name for name in names}
+        for ent in await ShortcutEntry.select(guild_id=guild_id):
+            name = folded.get(ent.name.casefold())
+            if name is not None and name != ent.name:
+                raise BadArgument(f"{name} only differs from the existing shortcut {ent.name} by case; remove that one first")
 
     """Commands for managing shortcuts/macros."""
     @has_permissions(manage_messages=True)
@@ -88,6 +135,7 @@ class Shortcuts(Cog):
         if not cmd_msg:
             raise BadArgument("can't have null message")
         
+        await self._check_case_clashes(ctx.guild.id, [cmd_name])
         ent: ShortcutEntry = await self.cache.query_one(guild_id=ctx.guild.id, name=cmd_name)
         if ent:
             ent.value = cmd_msg
@@ -99,6 +147,9 @@ class Shortcuts(Cog):
             ent.value = cmd_msg
             await ent.insert()
         self.cache.invalidate_entry(guild_id=ctx.guild.id, name=cmd_name)
+        self._generations[ctx.guild.id] += 1
+        if ctx.guild.id in self.guild_table:
+            self.guild_table[ctx.guild.id][cmd_name.casefold()] = cmd_msg
 
         await ctx.send("Updated command successfully.")
 
@@ -113,6 +164,9 @@ class Shortcuts(Cog):
         if ent:
             await ent.delete()
         self.cache.invalidate_entry(guild_id=ctx.guild.id, name=cmd_name)
+        self._generations[ctx.guild.id] += 1
+        if ctx.guild.id in self.guild_table:
+            self.guild_table[ctx.guild.id].pop(cmd_name.casefold(), None)
 
         await ctx.send("Removed command successfully.")
     
@@ -121,19 +175,89 @@ class Shortcuts(Cog):
         settings: ShortcutSetting = await self.settings_cache.query_one(guild_id=ctx.guild.id)
         if settings is None or not settings.approved:
             raise BadArgument("this feature is not approved yet")
-        
+
         ents: List[ShortcutEntry] = await ShortcutEntry.select(guild_id=ctx.guild.id)
-        embed = None
-        for i, e in enumerate(ents):
-            if i % 20 == 0:
-                if embed is not None:
-                    await ctx.send(embed=embed)
-                embed = discord.Embed()
-                embed.title = "shortcuts for this guild"
-            embed.add_field(name=e.name, value=e.value[:1024])
-            
-        if embed.fields:
-            await ctx.send(embed=embed)
+        if not ents:
+            await ctx.send("This server has no shortcuts.")
+            return
+        pages = []
+        for page in chunk(sorted(ents, key=lambda e: e.name.casefold()), 20):
+            embed = discord.Embed()
+            embed.title = "shortcuts for this guild"
+            for e in page:
+                embed.add_field(name=e.name, value=e.value[:1024])
+            pages.append(embed)
+        for i, embed in enumerate(pages):
+            embed.set_footer(text=f"Page {i + 1} of {len(pages)} ({len(ents)} shortcuts)")
+        await paginate(ctx, pages)
+
+    @has_permissions(manage_messages=True)
+    @shortcuts.command(name="import")
+    async def import_(self, ctx):
+        """Imports shortcuts from an attached CSV file of name,value rows, replacing ones with the same name."""
+        settings: ShortcutSetting = await self.settings_cache.query_one(guild_id=ctx.guild.id)
+        if settings is None or not settings.approved:
+            raise BadArgument("this feature is not approved yet")
+
+        if not ctx.message.attachments:
+            raise BadArgument("attach a CSV file of name,value rows to import")
+        attachment = ctx.message.attachments[0]
+        if attachment.size > self.MAX_IMPORT_BYTES:
+            raise BadArgument(f"the CSV file can be at most {self.MAX_IMPORT_BYTES // 1024}KiB")
+        data = await attachment.read()
+        try:
+            text = data.decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise BadArgument("the CSV file has to be UTF-8") from e
+
+        entries = {}
+        for line, row in enumerate(csv.reader(io.StringIO(text)), 1):
+            if not row or line == 1 and [c.strip().casefold() for c in row] == ["name", "value"]:
+                continue
+            if len(row) != 2:
+                raise BadArgument(f"line {line}: expected 2 columns (name,value), got {len(row)}")
+            name, value = row[0].strip(), row[1]
+            if not name.startswith(settings.prefix):
+                raise BadArgument(f"line {line}: command must start with the prefix {settings.prefix}")
+            if len(name) > self.MAX_LEN:
+                raise BadArgument(f"line {line}: command names can only be up to {self.MAX_LEN} chars long")
+            if not value:
+                raise BadArgument(f"line {line}: can't have null message")
+            if any(other != name and other.casefold() == name.casefold() for other in entries):
+                raise BadArgument(f"line {line}: {name} only differs from another shortcut in the file by case")
+            ent = ShortcutEntry()
+            ent.guild_id = ctx.guild.id
+            ent.name = name
+            ent.value = value
+            # the last row for a name wins, same as running shortcuts add for each row
+            entries[name] = ent
+        if not entries:
+            raise BadArgument("the CSV file has no shortcuts in it")
+        await self._check_case_clashes(ctx.guild.id, entries)
+
+        async with orm.transaction() as conn:
+            await ShortcutEntry.upsert_many(list(entries.values()), _conn=conn)
+        for name in entries:
+            self.cache.invalidate_entry(guild_id=ctx.guild.id, name=name)
+        self._generations[ctx.guild.id] += 1
+        self.guild_table.pop(ctx.guild.id, None)
+
+        await ctx.send(f"Imported {len(entries)} shortcuts successfully.")
+
+    @shortcuts.command()
+    async def export(self, ctx):
+        """Exports this server's shortcuts as a CSV file that shortcuts import can read back."""
+        settings: ShortcutSetting = await self.settings_cache.query_one(guild_id=ctx.guild.id)
+        if settings is None or not settings.approved:
+            raise BadArgument("this feature is not approved yet")
+
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(("name", "value"))
+        async for ent in ShortcutEntry.iter(guild_id=ctx.guild.id):
+            writer.writerow((ent.name, ent.value))
+        data = io.BytesIO(buf.getvalue().encode())
+        await ctx.send(file=discord.File(data, filename=f"shortcuts-{ctx.guild.id}.csv"))
 
     add.example_usage = """
     `{prefix}shortcuts add hello Hello, World!!!!` - adds !hello to the server
@@ -145,18 +269,23 @@ class Shortcuts(Cog):
     list.example_usage = """
     `{prefix}shortcuts list - lists all shortcuts
     """
-        
+    import_.example_usage = """
+    `{prefix}shortcuts import` (with a CSV file attached) - adds or replaces every shortcut in the file
+    """
+    export.example_usage = """
+    `{prefix}shortcuts export` - sends all shortcuts as a CSV file
+    """
+
     @Cog.listener()
     async def on_ready(self):
-        """reload sheets on_ready"""
-        pass
+        """preload shortcut settings for every guild on_ready"""
+        await self.settings_cache.preload("guild_id", [guild.id for guild in self.bot.guilds])
     
-    @Cog.listener()
-    async def on_message(self, msg):
+    @message_stage("shortcut_match", order=40)
+    async def shortcut_match(self, ctx):
         """prefix scanner"""
-        if not msg.guild or msg.author.bot:
-            return
-        setting = await self.settings_cache.query_one(guild_id=msg.guild.id)
+        msg = ctx.message
+        setting = await ctx.config(self.settings_cache)
         if setting is None or not setting.approved:
             return
 
@@ -167,19 +296,15 @@ class Shortcuts(Cog):
         if not c.startswith(setting.prefix):
             return
 
-        shortcuts = await ShortcutEntry.select(guild_id=msg.guild.id)
-        if not shortcuts:
-            return
-
-        for shortcut in shortcuts:
-            if c.lower() == shortcut.name.lower():
-                await msg.channel.send(shortcut.value)
-                return
+        value = (await self.guild_shortcuts(msg.guild.id)).get(c.casefold())
+        if value is not None:
+            await msg.channel.send(value)
 
 class ShortcutSetting(orm.Model):
     """Provides a DB config to track mutes."""
     __tablename__ = 'shortcut_settings'
     __primary_key__ = ("guild_id",)
+    __notify_keys__ = ("guild_id",)
     guild_id: psqlt.bigint # guild id
     approved: psqlt.boolean # whether the guild is approved for the feature or not
     spreadsheet: psqlt.text # the url of the spreadsheet
@@ -189,6 +314,7 @@ class ShortcutEntry(orm.Model):
     """Provides a DB config to track mutes."""
     __tablename__ = 'shortcuts'
     __primary_key__ = ("guild_id", "name")
+    __notify_keys__ = ("guild_id",)
     guild_id: psqlt.bigint
     name: psqlt.varchar(Shortcuts.MAX_LEN)
     value: psqlt.text
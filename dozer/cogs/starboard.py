@@ -6,14 +6,14 @@ from discord.ext.commands import has_permissions, guild_only
 
 from ._utils import *
 from ..asyncdb.orm import orm
-from ..asyncdb import psqlt
+from ..asyncdb import psqlt, configcache
 
 
 class Starboard(Cog):
     """Various starboard functions."""
     def __init__(self, bot):
         super().__init__(bot)
-        self.config_cache = {}
+        self.config_cache = configcache.AsyncConfigCache(StarboardConfig)
 
     def starboard_embed_footer(self, emoji=None, reaction_count=None):
         """create the footer for a starboard embed"""
@@ -73,17 +73,18 @@ class Starboard(Cog):
             msg_ent = StarboardMessage(message_id=msg.id, starboard_message_id=starboard_msg.id, reaction_count=reaction_count)
             await msg_ent.insert(_upsert="ON CONFLICT (message_id) DO UPDATE SET reaction_count=EXCLUDED.reaction_count")
 
+    @Cog.listener()
+    async def on_ready(self):
+        """Preload every guild's starboard config."""
+        await self.config_cache.preload("guild_id", [guild.id for guild in self.bot.guilds])
+
     @Cog.listener()
     async def on_reaction_add(self, reaction, member):
         """Handles core reaction logic."""
         msg = reaction.message
         if not msg.guild:
             return
-        if msg.guild.id in self.config_cache:
-            config = self.config_cache[msg.guild.id]
-        else:
-            config = await StarboardConfig.select_one(guild_id=msg.guild.id)
-            self.config_cache[msg.guild.id] = config
+        config = await self.config_cache.query_one(guild_id=msg.guild.id)
 
         # we cache null results for servers
         if config is None:
@@ -151,8 +152,7 @@ class Starboard(Cog):
         else:
             config = StarboardConfig(guild_id=ctx.guild.id, channel_id=channel.id, emoji=str(emoji), threshold=threshold)
             await config.insert()
-        if ctx.guild.id in self.config_cache:
-            del self.config_cache[ctx.guild.id]
+        self.config_cache.invalidate_entry(guild_id=ctx.guild.id)
         await ctx.send(embed=self.make_config_embed(ctx, f"Updated configuration for {ctx.guild}!", config))
     config.example_usage = """
     `{prefix}starboard config #hall-of-fame 🌟 5` - Set the bot to repost messages that have 5 star reactions to `#hall-of-fame`
@@ -191,6 +191,7 @@ class StarboardConfig(orm.Model):
     """Main starboard server config data"""
     __tablename__ = "starboard_config"
     __primary_key__ = ("guild_id",)
+    __notify_keys__ = ("guild_id",)
     guild_id: psqlt.bigint
     channel_id: psqlt.bigint
     emoji: psqlt.text
@@ -93,13 +93,12 @@ class Voicebinds(orm.Model):
     """DB object to keep track of voice to text channel access bindings."""
     __tablename__ = 'voicebinds'
     __primary_key__ = ('channel_id',)
+    __indexes__ = (("guild_id",),)
 
     guild_id: psqlt.bigint
     channel_id: psqlt.bigint
     role_id: psqlt.bigint
 
-# ALTER TABLE voicebinds DROP CONSTRAINT voicebinds_pkey;
-# ALTER TABLE voicebinds ADD PRIMARY KEY (channel_id);
 
 def setup(bot):
     """Add this cog to the main bot."""
@@ -0,0 +1,112 @@
+"""
+Notices when something blocks the event loop.
+
+A sampler task sleeps for a fixed interval and records how late it wakes up (the loop lag). A watchdog thread
+watches the sampler's heartbeat; when the loop hasn't come back for more than slow_callback_ms, it grabs the stack
+of the loop's thread, which shows whatever synchronous code is holding it. Once the loop comes back the stall is
+logged with that stack. This works on uvloop, where asyncio's own debug-mode slow callback warnings don't exist.
+"""
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class SlowCallback:
+    """One stretch of time the event loop was blocked."""
+    __slots__ = ("when", "duration", "stack")
+
+    def __init__(self, when, duration, stack):
+        self.when = when
+        self.duration = duration
+        self.stack = stack
+
+
+class LoopMonitor:
+    """Samples event loop lag every interval seconds and reports stalls longer than slow_callback_ms.
+    The last keep stalls are kept in slow_callbacks for the looplag command."""
+    # frames of the loop thread's stack to keep, innermost last
+    stack_depth = 20
+
+    def __init__(self, interval=0.25, slow_callback_ms=250, keep=20):
+        self.interval = interval
+        self.threshold = slow_callback_ms / 1000
+        self.lag = Histogram()
+        self.max_lag = 0.0
+        self.slow_callbacks = collections.deque(maxlen=keep)
+        self.stalls = 0
+        self._task = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._loop_thread_id = None
+        # written by the sampler, read by the watchdog thread
+        self._last_beat = time.monotonic()
+        # written by the watchdog thread while the loop is stuck, consumed by the sampler once it runs again
+        self._captured = None
+
+    def start(self, loop=None):
+        """Starts sampling on loop (the running loop by default). Has to be called from the loop's thread."""
+        if self._task is not None:
+            return
+        loop = loop or asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._task = loop.create_task(self._sample())
+        self._thread = threading.Thread(target=self._watch, name="dozer-loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling."""
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._thread = None
+
+    def reset(self):
+        """Clears the recorded lag and stalls."""
+        self.lag = Histogram()
+        self.max_lag = 0.0
+        self.slow_callbacks.clear()
+        self.stalls = 0
+
+    async def _sample(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - started - self.interval, 0.0)
+            self._last_beat = now
+            self.lag.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            captured, self._captured = self._captured, None
+            if captured is not None:
+                self._report(captured, lag)
+
+    def _report(self, stack, lag):
+        """Logs a stall the watchdog caught."""
+        self.stalls += 1
+        self.slow_callbacks.append(SlowCallback(time.time(), lag, stack))
+        logger.warning(f"The event loop was blocked for {lag * 1000:.0f}ms. It was running:\n{''.join(stack)}")
+
+    def _watch(self):
+        """Runs in the watchdog thread: captures the loop thread's stack while it's blocked, once per stall."""
+        check_every = max(self.threshold / 4, 0.01)
+        captured_beat = None
+        while not self._stopping.wait(check_every):
+            beat = self._last_beat
+            if beat == captured_beat or time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._captured = traceback.format_stack(frame)[-self.stack_depth:]
+            captured_beat = beat
@@ -0,0 +1,156 @@
+"""
+Latency histograms for event handlers, cog listeners, commands and message stages.
+
+Dozer records into a Metrics object as events are dispatched, see Dozer._run_event and Dozer.invoke.
+The `metrics` dev command shows them. If `metrics_port` is set in the config, a small aiohttp server also serves
+them in the Prometheus text format at http://metrics_host:metrics_port/metrics.
+"""
+import collections
+import logging
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# kind of timing -> (metric name prefix, label name, description)
+KINDS = {
+    "event": ("dozer_event", "event", "Time spent handling a gateway event, per handler run"),
+    "listener": ("dozer_listener", "listener", "Time spent in a single event listener"),
+    "command": ("dozer_command", "command", "Time spent running a command, checks included"),
+    "message_stage": ("dozer_message_stage", "stage", "Time spent in a stage of the message pipeline"),
+}
+
+
+class Histogram:
+    """Latency histogram for one thing being timed.
+    Bucket counts cover everything since startup (or the last reset), as Prometheus expects;
+    percentiles come from a window of the most recent timings, so they follow how the bot is doing now."""
+    __slots__ = ("buckets", "count", "total_time", "errors", "cancelled", "recent")
+    window = 1000
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total_time = 0.0
+        self.errors = 0
+        self.cancelled = 0
+        self.recent = collections.deque(maxlen=self.window)
+
+    def observe(self, elapsed, failed=False, cancelled=False):
+        """Adds one run."""
+        self.count += 1
+        self.total_time += elapsed
+        self.errors += failed
+        self.cancelled += cancelled
+        self.recent.append(elapsed)
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                break
+
+    @property
+    def mean(self):
+        """Mean time of a run since startup, in seconds."""
+        return self.total_time / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """Returns the p-th percentile (0-100) of the recent timings, in seconds."""
+        if not self.recent:
+            return 0.0
+        timings = sorted(self.recent)
+        return timings[min(len(timings) - 1, int(len(timings) * p / 100))]
+
+
+def _label(value):
+    """Escapes a Prometheus label value."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Metrics:
+    """Histograms of every kind in KINDS, by name."""
+    def __init__(self):
+        self.histograms = {kind: collections.defaultdict(Histogram) for kind in KINDS}
+
+    def observe(self, kind, name, elapsed, failed=False, cancelled=False):
+        """Records one run of name."""
+        self.histograms[kind][name].observe(elapsed, failed, cancelled)
+
+    def histogram(self, kind, name):
+        """Returns the histogram of name, creating it if needed."""
+        return self.histograms[kind][name]
+
+    def totals(self, kind):
+        """Returns (runs, errors, cancelled) summed over every histogram of a kind."""
+        runs = errors = cancelled = 0
+        for hist in self.histograms[kind].values():
+            runs += hist.count
+            errors += hist.errors
+            cancelled += hist.cancelled
+        return runs, errors, cancelled
+
+    def reset(self):
+        """Clears every histogram."""
+        for histograms in self.histograms.values():
+            histograms.clear()
+
+    def render(self, gauges=()):
+        """Renders everything in the Prometheus text format. gauges is an iterable of (name, description, value)."""
+        lines = []
+        for kind, (prefix, label, description) in KINDS.items():
+            histograms = sorted(self.histograms[kind].items())
+            lines.append(f"# HELP {prefix}_duration_seconds {description}.")
+            lines.append(f"# TYPE {prefix}_duration_seconds histogram")
+            for name, hist in histograms:
+                name = _label(name)
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.buckets):
+                    cumulative += count
+                    lines.append(f'{prefix}_duration_seconds_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_duration_seconds_bucket{{{label}="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{prefix}_duration_seconds_sum{{{label}="{name}"}} {hist.total_time}')
+                lines.append(f'{prefix}_duration_seconds_count{{{label}="{name}"}} {hist.count}')
+            for counter, attr, what in (("errors", "errors", "raised an exception"), ("cancelled", "cancelled", "were cancelled")):
+                lines.append(f"# HELP {prefix}_{counter}_total Runs that {what}.")
+                lines.append(f"# TYPE {prefix}_{counter}_total counter")
+                for name, hist in histograms:
+                    lines.append(f'{prefix}_{counter}_total{{{label}="{_label(name)}"}} {getattr(hist, attr)}')
+        for name, description, value in gauges:
+            lines.append(f"# HELP {name} {description}.")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a Metrics object at /metrics for Prometheus to scrape.
+    gauges is called on every scrape and returns extra (name, description, value) gauges."""
+    def __init__(self, metrics, host, port, gauges=None):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.gauges = gauges or (lambda: ())
+        self.runner = None
+
+    async def handle(self, request):  # pylint: disable=unused-argument
+        """Handles GET /metrics."""
+        return web.Response(body=self.metrics.render(self.gauges()).encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    async def start(self):
+        """Starts listening."""
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info(f"Serving metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        """Stops listening."""
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None